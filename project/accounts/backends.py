@@ -0,0 +1,47 @@
+"""
+Authentication backend caching the logged-in user with its profile.
+
+``AuthenticationMiddleware`` loads ``request.user`` through
+``get_user`` on every request, and ``base.html`` then reads
+``request.user.profile``. The backend reads both with one joined query and
+keeps the pair in the cache until the user or the profile is saved, or for
+``ACCOUNTS_USER_CACHE_TIMEOUT`` seconds in the other processes when the cache
+is not shared.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.core.cache import cache
+
+USER_CACHE_KEY = 'accounts:user:{}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` whose ``get_user`` goes through the cache.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None:
+            # stops authenticate() there, ModelBackend comes next in
+            # AUTHENTICATION_BACKENDS and would hash the password again
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        key = USER_CACHE_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, user, timeout=settings.ACCOUNTS_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,40 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the expired sessions in small batches, unlike clearsessions '
+        'which deletes them in one statement holding the write lock.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of sessions deleted per statement.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.05,
+            help='Seconds to wait between batches, letting the site write meanwhile.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        now = timezone.now()
+        count = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:options['batch_size']]
+            )
+            if not keys:
+                break
+            count += Session.objects.filter(session_key__in=keys).delete()[0]
+            time.sleep(options['sleep'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {count} expired sessions in {elapsed:.2f}s.'
+        ))
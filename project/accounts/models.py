@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from .backends import invalidate_cached_user
 # Create your models here.
 
 
@@ -23,3 +24,17 @@ def create_profile(sender,instance,created,**kwargs):
 
 post_save.connect(create_profile,sender=User)
 
+
+
+# Dropping the cached request.user (see backends.py) when it changes
+def invalidate_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+def invalidate_profile_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+post_save.connect(invalidate_user,sender=User)
+post_delete.connect(invalidate_user,sender=User)
+post_save.connect(invalidate_profile_user,sender=Profile)
+post_delete.connect(invalidate_profile_user,sender=Profile)
@@ -0,0 +1,97 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import BACKEND_SESSION_KEY, authenticate
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .backends import CachedModelBackend
+
+
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def test_user_and_profile_are_read_once(self):
+        backend = CachedModelBackend()
+        with self.assertNumQueries(1):
+            backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk).profile.name, 'reader')
+
+    def test_profile_update_refreshes_the_cached_user(self):
+        self.client.get(reverse('profile'))
+        response = self.client.post(reverse('profile'), {'name': 'New Name', 'age': 30, 'bio': 'hi'}, follow=True)
+        self.assertContains(response, 'New Name')
+
+    def test_password_change_logs_out_other_sessions(self):
+        other = self.client_class()
+        other.force_login(self.user)
+        other.get(reverse('home'))
+        self.user.set_password('another-pass-456')
+        self.user.save()
+        self.assertRedirects(other.get(reverse('home')), reverse('login') + '?next=/')
+
+    def test_sessions_opened_with_model_backend_stay_logged_in(self):
+        session = self.client.session
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session.save()
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+
+    def test_wrong_password_is_hashed_once(self):
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as checked:
+            self.assertIsNone(authenticate(username='reader', password='wrong-pass'))
+        self.assertEqual(checked.call_count, 1)
+        self.assertEqual(authenticate(username='reader', password='secret-pass-123'), self.user)
+
+
+class PruneSessionsTests(TestCase):
+
+    def test_only_expired_sessions_are_deleted(self):
+        for i in range(5):
+            store = SessionStore()
+            store['i'] = i
+            store.create()
+        Session.objects.update(expire_date=timezone.now() - timedelta(days=1))
+        kept = SessionStore()
+        kept.create()
+        out = StringIO()
+        call_command('prune_sessions', batch_size=2, sleep=0, stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [kept.session_key])
+
+
+@override_settings(RATELIMITS={'login': '2/m'})
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='reader', password='secret-pass-123')
+
+    def test_login_attempts_are_limited_per_address(self):
+        data = {'username': 'reader', 'password': 'wrong-pass'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('login'), data).status_code, 302)
+        # rejected before the form authenticates, so no user lookup
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('login'), data)
+        self.assertEqual(response.status_code, 429)
+        self.assertLessEqual(int(response['Retry-After']), 60)
+        # other addresses and the login page itself are not affected
+        self.assertEqual(self.client.post(reverse('login'), data, REMOTE_ADDR='10.0.0.2').status_code, 302)
+        self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+
+    def test_unlisted_views_are_not_limited(self):
+        for _ in range(3):
+            self.assertNotEqual(self.client.post(reverse('register'), {}).status_code, 429)
@@ -5,6 +5,7 @@ from .forms import SignUpForm,LoginForm,ChangePasswordForm,ProfileForm
 from django.contrib import messages
 from .models import *
 from django.contrib.auth.decorators import login_required
+from blog.images import queue_image_processing
 
 
 @login_required 
@@ -14,7 +15,9 @@ def profile(request):
     if request.method == 'POST':
             form = ProfileForm(request.POST,request.FILES,instance=profile)
             if form.is_valid():
-                form.save()
+                profile = form.save()
+                if 'image' in form.changed_data:
+                    queue_image_processing(profile.image.name)
                 messages.success(request,'Your info has been updated.')
                 return redirect('home')
     else:
@@ -1,8 +1,57 @@
-from django.contrib import admin
-from .models import Blog,Comment,ContactInfo,ContactUs
+from django.contrib import admin, messages
+from django.utils.text import Truncator
+from .instrumentation import url_percentiles
+from .moderation import moderate
+from .models import Blog,Comment,ContactInfo,ContactUs,Job,RequestSample
 # Register your models here.
 
 admin.site.register(Blog)
-admin.site.register(Comment)
-admin.site.register(ContactInfo)
 admin.site.register(ContactUs)
+admin.site.register(Job)
+
+
+@admin.register(RequestSample)
+class RequestSampleAdmin(admin.ModelAdmin):
+    list_display = ('url_name', 'status', 'total_ms', 'sql_ms', 'template_ms', 'queries', 'duplicates', 'created_at')
+    list_filter = ('url_name', 'status')
+    change_list_template = 'admin/blog/requestsample/change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'percentiles': url_percentiles()}
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(ContactInfo)
+class ContactInfoAdmin(admin.ModelAdmin):
+
+    def has_add_permission(self, request):
+        # a single row, saved with the singleton primary key
+        return not ContactInfo.objects.exists()
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('short_comment', 'blog', 'user', 'active', 'created_at', 'moderated_at')
+    # both filters are served by the blog_comment_moderation index
+    list_filter = ('active', 'created_at', ('moderated_at', admin.EmptyFieldListFilter))
+    list_select_related = ('blog', 'user')
+    ordering = ('active', '-created_at')
+    raw_id_fields = ('blog', 'user')
+    # no COUNT(*) of the whole table next to the filtered one
+    show_full_result_count = False
+    list_per_page = 200
+    actions = ['approve', 'reject']
+
+    @admin.display(description='comment')
+    def short_comment(self, comment):
+        return Truncator(comment.comment).chars(80)
+
+    @admin.action(description='Approve the selected comments')
+    def approve(self, request, queryset):
+        count = moderate(queryset, approve=True)
+        self.message_user(request, f'{count} comments approved.', messages.SUCCESS)
+
+    @admin.action(description='Reject the selected comments')
+    def reject(self, request, queryset):
+        count = moderate(queryset, approve=False)
+        self.message_user(request, f'{count} comments rejected.', messages.SUCCESS)
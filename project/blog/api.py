@@ -0,0 +1,158 @@
+"""
+Read API of the posts, comments and tags.
+
+The lists are paginated with the keyset ``CursorPaginator`` of the HTML
+feeds, so deep pages cost the same as the first one, and take a sparse
+fieldset (``?fields=id,title``). ``export`` streams a whole table as NDJSON,
+one object per line, reading it in chunks with ``QuerySet.iterator``.
+"""
+from django.conf import settings
+from django.db import router
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Blog, Comment, Tag
+from .pagination import CursorPaginator
+from .replicas import read_replica
+from .serializers import BlogSerializer, CommentSerializer, TagSerializer
+
+# the resources of the export, with their serializer and ordering
+EXPORTS = {
+    'blogs': (BlogSerializer, ('-date', '-id')),
+    'comments': (CommentSerializer, ('-id',)),
+    'tags': (TagSerializer, ('name', 'id')),
+}
+
+
+def _querysets():
+    return {
+        'blogs': Blog.objects.all(),
+        # the API only shows the comments the site shows
+        'comments': Comment.objects.filter(active=True),
+        'tags': Tag.objects.all(),
+    }
+
+
+def _page_size(request):
+    try:
+        size = int(request.query_params.get('page_size', settings.BLOG_API_PAGE_SIZE))
+    except ValueError:
+        size = settings.BLOG_API_PAGE_SIZE
+    return max(1, min(size, settings.BLOG_API_MAX_PAGE_SIZE))
+
+
+def _paginated(request, queryset, serializer_class, ordering):
+    fields = serializer_class.requested_fields(request)
+    queryset = serializer_class.setup_queryset(queryset, fields)
+    paginator = CursorPaginator(queryset, _page_size(request), ordering=ordering)
+    page = paginator.get_page(request.query_params.get('cursor'))
+    url = request.build_absolute_uri()
+    return Response({
+        'next': replace_query_param(url, 'cursor', page.next_cursor) if page.has_next() else None,
+        'previous': replace_query_param(url, 'cursor', page.previous_cursor) if page.has_previous() else None,
+        'results': serializer_class(page, many=True, fields=fields).data,
+    })
+
+
+@api_view(['GET'])
+@read_replica
+def blog_list(request):
+    """
+    Lists the posts, newest first.
+
+    Args:
+        request (HttpRequest): Can filter on ``?tag=<slug>`` and ``?author=<username>``.
+
+    Returns:
+        Response: A page of posts with the ``next`` and ``previous`` page URLs.
+    """
+    blogs = Blog.objects.all()
+    if tag := request.query_params.get('tag'):
+        blogs = blogs.filter(tags__slug=tag)
+    if author := request.query_params.get('author'):
+        blogs = blogs.filter(author__username=author)
+    return _paginated(request, blogs, BlogSerializer, EXPORTS['blogs'][1])
+
+
+@api_view(['GET'])
+@read_replica
+def blog_detail(request, pk):
+    """
+    Returns one post.
+    """
+    fields = BlogSerializer.requested_fields(request)
+    blog = get_object_or_404(BlogSerializer.setup_queryset(Blog.objects.all(), fields), pk=pk)
+    return Response(BlogSerializer(blog, fields=fields).data)
+
+
+@api_view(['GET'])
+@read_replica
+def comment_list(request):
+    """
+    Lists the active comments, newest first.
+
+    Args:
+        request (HttpRequest): Can filter on ``?blog=<id>``.
+
+    Returns:
+        Response: A page of comments with the ``next`` and ``previous`` page URLs.
+    """
+    comments = _querysets()['comments']
+    if blog := request.query_params.get('blog'):
+        if not blog.isdigit():
+            raise Http404('No Blog matches the given query.')
+        comments = comments.filter(blog_id=blog)
+    return _paginated(request, comments, CommentSerializer, EXPORTS['comments'][1])
+
+
+@api_view(['GET'])
+@read_replica
+def tag_list(request):
+    """
+    Lists the tags by name.
+    """
+    return _paginated(request, Tag.objects.all(), TagSerializer, EXPORTS['tags'][1])
+
+
+def _ndjson(queryset, serializer_class, fields, chunk_size):
+    encoder = JSONEncoder(ensure_ascii=False)
+    # one serializer for the whole stream, its fields are only set up once
+    serializer = serializer_class(fields=fields)
+    # the prefetches of setup_queryset run once per chunk
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield encoder.encode(serializer.to_representation(obj)) + '\n'
+
+
+@api_view(['GET'])
+@read_replica
+def export(request, resource):
+    """
+    Streams every post, active comment or tag as NDJSON.
+
+    The rows are read ``BLOG_API_EXPORT_CHUNK_SIZE`` at a time, so the
+    memory used does not grow with the table.
+
+    Args:
+        request (HttpRequest): Takes a sparse fieldset like the lists.
+        resource (str): ``blogs``, ``comments`` or ``tags``.
+
+    Returns:
+        StreamingHttpResponse: One JSON object per line.
+    """
+    if resource not in EXPORTS:
+        raise Http404(f'Nothing to export as {resource}.')
+    serializer_class, ordering = EXPORTS[resource]
+    fields = serializer_class.requested_fields(request)
+    queryset = serializer_class.setup_queryset(_querysets()[resource], fields).order_by(*ordering)
+    # the body is generated after the view returned, pin the database of the request
+    queryset = queryset.using(router.db_for_read(queryset.model))
+    response = StreamingHttpResponse(
+        _ndjson(queryset, serializer_class, fields, settings.BLOG_API_EXPORT_CHUNK_SIZE),
+        content_type='application/x-ndjson',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{resource}.ndjson"'
+    return response
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from project.db import configure_sqlite
+        from . import signals  # noqa: F401
+
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,318 @@
+"""
+Bulk import and export of posts, as NDJSON or CSV.
+
+A record holds ``title``, ``content``, ``author`` (a username), ``tags`` (a
+list, or a comma separated string like in the post form), ``date`` (ISO 8601)
+and ``image``. ``import_blogs`` reads the records in batches and writes each
+batch with a handful of ``bulk_create`` calls in one transaction: the missing
+authors with their profiles, the missing tags, the posts and their tagged
+items. The images of a batch are copied into the storage by a thread pool
+before it is written.
+
+``bulk_create`` neither calls ``save`` nor sends ``post_save``, so what they
+maintain is done here: the excerpts are computed per post, and once every
+batch is in, the imported posts are indexed for search, their related posts
+and the statistics of their tags are refreshed, the refresh of the older
+posts sharing their tags is queued, and their images are queued for
+processing with one insert.
+
+The ``image`` paths of the records must stay inside the images directory:
+absolute paths and ``..`` segments are rejected.
+"""
+import csv
+import json
+import os
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from taggit.models import TaggedItem
+from taggit.utils import edit_string_for_tags, parse_tags
+
+from accounts.models import Profile
+
+from . import search
+from .excerpts import summarize
+from .fragments import invalidate_fragments
+from .images import queue_images_processing
+from .jobs import enqueue
+from .models import Blog, Tag
+from .related import refresh_related_posts
+from .tagstats import refresh_tag_stats
+
+FIELDS = ['id', 'title', 'content', 'author', 'tags', 'date', 'image']
+IMAGE_DIR = 'blog-images'
+
+
+def read_records(stream, fmt):
+    """
+    Yields the records of an NDJSON or CSV stream, one dict at a time.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'line {number}: {error}') from error
+
+
+def write_records(stream, fmt, records):
+    """
+    Writes records as NDJSON or CSV and returns how many were written.
+    """
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow({**record, 'tags': edit_string_for_tags(record['tags'])})
+            count += 1
+        return count
+    for record in records:
+        stream.write(json.dumps({**record, 'tags': [tag.name for tag in record['tags']]}, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def export_records(batch_size=500):
+    """
+    Yields every post as a record, reading ``batch_size`` posts at a time.
+
+    The ``tags`` of the records are ``Tag`` objects, ``write_records`` turns
+    them into names.
+    """
+    blogs = Blog.objects.select_related('author').prefetch_related('tags').order_by('id')
+    for blog in blogs.iterator(chunk_size=batch_size):
+        yield {
+            'id': blog.id,
+            'title': blog.title,
+            'content': blog.content,
+            'author': blog.author.username,
+            'tags': list(blog.tags.all()),
+            'date': blog.date.isoformat(),
+            'image': blog.image.name,
+        }
+
+
+def export_images(names, images_dir, workers=8):
+    """
+    Copies images from the storage into ``images_dir`` with a thread pool,
+    under the names the records refer to.
+
+    Returns:
+        int: The number of images copied.
+    """
+    def copy(name):
+        target = os.path.join(images_dir, *name.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with default_storage.open(name, 'rb') as source, open(target, 'wb') as copied:
+            for chunk in source.chunks():
+                copied.write(chunk)
+
+    names = sorted(set(filter(None, names)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(copy, names))
+    return len(names)
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _tag_names(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return parse_tags(value)
+    return sorted({str(name).strip() for name in value if str(name).strip()})
+
+
+def _date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'invalid date {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _authors(usernames):
+    """
+    Returns ``{username: user_id}``, creating the missing users and their profiles.
+
+    The new users get an unusable password, they reset it to log in.
+    """
+    ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    missing = sorted(set(usernames) - set(ids))
+    if missing:
+        users = User.objects.bulk_create([User(username=name, password=make_password(None)) for name in missing])
+        Profile.objects.bulk_create([Profile(user_id=user.pk, name=user.username) for user in users])
+        ids.update((user.username, user.pk) for user in users)
+    return ids
+
+
+def _tags(names):
+    """
+    Returns ``{name: tag_id}``, creating the missing tags.
+
+    Tags whose slug is taken by another name go through ``Tag.save``, which
+    finds a free slug, the others are inserted together.
+    """
+    ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = sorted(set(names) - set(ids))
+    if not missing:
+        return ids
+    slugs = {name: Tag().slugify(name) for name in missing}
+    taken = set(Tag.objects.filter(slug__in=slugs.values()).values_list('slug', flat=True))
+    new, clashing = [], []
+    for name in missing:
+        if slugs[name] in taken:
+            clashing.append(name)
+        else:
+            taken.add(slugs[name])
+            new.append(Tag(name=name, slug=slugs[name]))
+    for tag in Tag.objects.bulk_create(new):
+        ids[tag.name] = tag.pk
+    for name in clashing:
+        tag = Tag(name=name)
+        tag.save()
+        ids[name] = tag.pk
+    return ids
+
+
+def _check_image_path(path):
+    """
+    Rejects the image paths of a record that would leave the images directory.
+    """
+    parts = path.replace('\\', '/').split('/')
+    if path.startswith(('/', '\\')) or os.path.isabs(path):
+        raise ValueError(f'the image path {path!r} is absolute')
+    if '..' in parts:
+        raise ValueError(f'the image path {path!r} leaves the images directory')
+
+
+def _copy_image(images_dir, path):
+    with open(os.path.join(images_dir, path), 'rb') as source:
+        # the storage picks a free name when the file name is taken
+        return default_storage.save(posixpath.join(IMAGE_DIR, os.path.basename(path)), File(source))
+
+
+def _import_batch(records, images, content_type):
+    usernames = {record['author'] for record in records}
+    tag_names = [_tag_names(record.get('tags')) for record in records]
+    with transaction.atomic():
+        authors = _authors(usernames)
+        tags = _tags({name for names in tag_names for name in names})
+        blogs = []
+        for record, image in zip(records, images):
+            blog = Blog(
+                author_id=authors[record['author']],
+                title=record['title'],
+                content=record.get('content') or '',
+                image=image,
+            )
+            blog.excerpt, blog.word_count, blog.reading_time = summarize(blog.content)
+            blogs.append(blog)
+        Blog.objects.bulk_create(blogs)
+        # bulk_create applies auto_now_add, the original dates are set afterwards
+        for blog, record in zip(blogs, records):
+            blog.date = blog.updated_at = _date(record.get('date'))
+        Blog.objects.bulk_update(blogs, ['date', 'updated_at'])
+        TaggedItem.objects.bulk_create([
+            TaggedItem(content_type=content_type, object_id=blog.pk, tag_id=tags[name])
+            for blog, names in zip(blogs, tag_names)
+            for name in names
+        ])
+    return blogs, set(tags.values())
+
+
+def import_blogs(records, batch_size=500, images_dir=None, workers=8, progress=None):
+    """
+    Creates posts from records, ``batch_size`` at a time.
+
+    Args:
+        records (iterable): The records, see the module docstring.
+        batch_size (int): Number of posts written per transaction.
+        images_dir (str): Directory the ``image`` paths of the records are
+            relative to, their files are copied into the storage. Without
+            it the paths are taken as names already in the storage.
+        workers (int): Number of threads copying the images.
+        progress (callable): Called with the number of posts imported so
+            far and the seconds elapsed, after each batch.
+
+    Returns:
+        int: The number of posts imported.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise ValueError('the database does not return the primary keys of bulk inserts')
+    content_type = ContentType.objects.get_for_model(Blog)
+    started = time.monotonic()
+    total = 0
+    imported_ids = []
+    imported_tag_ids = set()
+    imported_images = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch in _batches(records, batch_size):
+                for index, record in enumerate(batch, start=total + 1):
+                    if not record.get('title') or not record.get('author'):
+                        raise ValueError(f'record {index}: the title and the author are required')
+                    if images_dir and record.get('image'):
+                        try:
+                            _check_image_path(record['image'])
+                        except ValueError as error:
+                            raise ValueError(f'record {index}: {error}') from error
+                paths = [record.get('image') or '' for record in batch]
+                if images_dir:
+                    images = list(executor.map(
+                        lambda path: _copy_image(images_dir, path) if path else '', paths
+                    ))
+                else:
+                    images = paths
+                blogs, tag_ids = _import_batch(batch, images, content_type)
+                imported_ids.extend(blog.pk for blog in blogs)
+                imported_tag_ids |= tag_ids
+                imported_images.extend((blog.image.name, blog.pk) for blog in blogs if blog.image)
+                total += len(blogs)
+                if progress:
+                    progress(total, time.monotonic() - started)
+    finally:
+        # the batches written before a failure are kept, finish them too
+        if total:
+            search.get_backend().reindex(imported_ids, batch_size)
+            for start in range(0, len(imported_ids), batch_size):
+                refresh_related_posts(imported_ids[start:start + batch_size])
+            if imported_tag_ids:
+                # the older posts sharing the tags can be most of the table
+                enqueue(
+                    'blog.related.refresh_neighbours',
+                    blog_id=None,
+                    tag_ids=sorted(imported_tag_ids),
+                    exclude_ids=imported_ids,
+                )
+            refresh_tag_stats(imported_tag_ids)
+            queue_images_processing(imported_images)
+            invalidate_fragments()
+    return total
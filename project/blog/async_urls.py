@@ -0,0 +1,15 @@
+"""
+URLconf serving the async read views whatever ``BLOG_ASYNC_VIEWS`` says,
+for the tests and the WSGI/ASGI benchmark.
+"""
+from django.urls import include, path
+
+from . import async_views
+
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('post/<int:pk>', async_views.post, name='post'),
+    path('tags/<slug:tag>', async_views.get_tags, name='tags'),
+    path('last_post/', async_views.last_post, name='last_post'),
+    path('', include('project.urls')),
+]
@@ -0,0 +1,141 @@
+"""
+Async versions of the read-only blog views, used when ``BLOG_ASYNC_VIEWS`` is on.
+
+They return the same pages as ``blog.views``. The queries use the async ORM,
+and the independent ones of the post page (post, comments, related posts)
+are awaited together. Django 5.0's async ORM still runs every query through
+``sync_to_async(thread_sensitive=True)``, so the queries of one request run
+one after the other in the thread of that request: what async buys is that
+waiting requests don't hold a worker thread each. Templates are rendered in
+that same thread too.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+
+from .conditional import conditional_page, feed_validator, post_validator, tag_validator
+from .models import Blog, Tag
+from .pagination import CursorPaginator
+from .replicas import read_replica
+from .search import ranked_blogs
+from .views import comment_paginator, related_posts_of
+
+arender = sync_to_async(render)
+
+
+def login_required(view):
+    """
+    ``login_required`` for async views (Django 5.1 has it built in).
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _page(paginator, request):
+    return await sync_to_async(paginator.get_page)(request.GET.get('cursor'))
+
+
+@login_required
+@read_replica
+@conditional_page(feed_validator)
+async def last_post(request):
+    """
+    Async version of ``blog.views.last_post``.
+    """
+    post = await Blog.objects.select_related('author').prefetch_related('tags').alatest('date')
+    comments, related_posts = await asyncio.gather(
+        _page(comment_paginator(post.id), request),
+        _list(related_posts_of(post.id)),
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+        'related_posts': related_posts
+    }
+    return await arender(request, 'pages/post.html', context)
+
+
+@login_required
+@read_replica
+@conditional_page(tag_validator)
+async def get_tags(request, tag):
+    """
+    Async version of ``blog.views.get_tags``.
+    """
+    try:
+        tag = await Tag.objects.aget(slug=tag)
+    except Tag.DoesNotExist:
+        raise Http404('No Tag matches the given query.')
+    blogs = Blog.objects.filter(tags__in=[tag]).select_related('author').defer('content')
+    page_posts = await _page(CursorPaginator(blogs, settings.BLOG_PAGE_SIZE), request)
+    return await arender(request, 'pages/index.html', {'blogs': page_posts})
+
+
+@login_required
+@read_replica
+@conditional_page(post_validator)
+async def post(request, pk):
+    """
+    Async version of ``blog.views.post``.
+
+    The page of comments and the related posts only need the primary key,
+    so they are read together with the post.
+    """
+    async def get_post():
+        try:
+            return await Blog.objects.select_related('author').prefetch_related('tags').aget(id=pk)
+        except Blog.DoesNotExist:
+            raise Http404('No Blog matches the given query.')
+
+    post, comments, related_posts = await asyncio.gather(
+        get_post(),
+        _page(comment_paginator(pk), request),
+        _list(related_posts_of(pk)),
+    )
+
+    context = {
+        'post': post,
+        'comments': comments,
+        'related_posts': related_posts
+    }
+    return await arender(request, 'pages/post.html', context)
+
+
+@login_required
+@read_replica
+@conditional_page(feed_validator)
+async def home(request):
+    """
+    Async version of ``blog.views.home``.
+    """
+    search = request.GET.get('search')
+    if search:
+        # the search backend lookup is sync
+        blogs = await sync_to_async(ranked_blogs)(search, Blog.objects.select_related('author').defer('content'))
+        paginator = CursorPaginator(blogs, settings.BLOG_PAGE_SIZE, ordering=('search_rank',))
+    else:
+        # the cards show the stored excerpt, the content is only read by post
+        blogs = Blog.objects.select_related('author').defer('content')
+        paginator = CursorPaginator(blogs, settings.BLOG_PAGE_SIZE)
+
+    page_posts = await _page(paginator, request)
+
+    context = {
+        'blogs': page_posts,
+        'search': search,
+    }
+    return await arender(request, 'pages/index.html', context)
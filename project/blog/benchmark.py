@@ -0,0 +1,312 @@
+"""
+Benchmarks of the blog and accounts endpoints.
+
+``generate_data`` fills the database with synthetic users, posts, tags and
+comments using bulk inserts, and ``run_scenario`` replays one endpoint with the
+Django test client, measuring the latency and the queries of every request.
+``run_concurrent`` sends the read scenarios from many clients at once,
+through the WSGI handler with one thread per client or through the ASGI
+handler with the async views. The ``benchmark`` management command runs them
+against a throwaway test database and compares the results with a stored
+baseline.
+"""
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from asgiref.sync import ThreadSensitiveContext
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from taggit.models import Tag, TaggedItem
+
+from accounts.models import Profile
+
+from . import search
+from .counters import active_comment_count
+from .excerpts import summarize
+from .instrumentation import percentile
+from .models import Blog, Comment
+from .related import rebuild_related_posts
+from .tagstats import rebuild_tag_stats
+
+PASSWORD = 'benchmark-pass-123'
+WORDS = (
+    'django python query index cache template view model database server '
+    'request response latency page post comment tag search user profile'
+).split()
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_data(users=50, blogs=500, comments=5000, tags=30, seed=0, batch_size=500):
+    """
+    Fills the database with synthetic data, in bulk.
+
+    ``bulk_create`` neither calls ``save`` nor sends ``post_save``, so the
+    profiles, the excerpts, the comment counters, the search index, the
+    related posts and the tag statistics are built explicitly.
+
+    Args:
+        users (int): Number of users, each with a profile.
+        blogs (int): Number of posts, each with 1 to 4 tags.
+        comments (int): Number of comments spread over the posts.
+        tags (int): Number of distinct tags.
+        seed (int): Seed of the random generator, for repeatable data.
+        batch_size (int): Number of rows inserted at a time.
+
+    Returns:
+        dict: The usernames, blog ids and tag slugs created.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [User(username=f'bench{i}', password=password) for i in range(users)],
+            batch_size=batch_size,
+        )
+        user_ids = list(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+        Profile.objects.bulk_create(
+            [Profile(user_id=user_id, name=f'bench {user_id}', bio=_text(rng, 10)) for user_id in user_ids],
+            batch_size=batch_size,
+        )
+
+        new_blogs = [
+            Blog(
+                author_id=rng.choice(user_ids),
+                title=_text(rng, 5),
+                content=_text(rng, 200),
+                image='blog-images/benchmark.png',
+            )
+            for _ in range(blogs)
+        ]
+        for blog in new_blogs:
+            blog.excerpt, blog.word_count, blog.reading_time = summarize(blog.content)
+        Blog.objects.bulk_create(new_blogs, batch_size=batch_size)
+        blog_ids = list(Blog.objects.values_list('id', flat=True))
+
+        Tag.objects.bulk_create([Tag(name=f'bench-tag-{i}', slug=f'bench-tag-{i}') for i in range(tags)])
+        tag_ids = list(Tag.objects.filter(slug__startswith='bench-tag-').values_list('id', flat=True))
+        content_type = ContentType.objects.get_for_model(Blog)
+        TaggedItem.objects.bulk_create(
+            [
+                TaggedItem(content_type=content_type, object_id=blog_id, tag_id=tag_id)
+                for blog_id in blog_ids
+                for tag_id in rng.sample(tag_ids, rng.randint(1, min(4, len(tag_ids))))
+            ],
+            batch_size=batch_size,
+        )
+
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    comment=_text(rng, 20),
+                    blog_id=rng.choice(blog_ids),
+                    user_id=rng.choice(user_ids),
+                    active=rng.random() < 0.9,
+                )
+                for _ in range(comments)
+            ],
+            batch_size=batch_size,
+        )
+        Blog.objects.update(comment_count=active_comment_count())
+
+    search.get_backend().rebuild()
+    rebuild_related_posts()
+    rebuild_tag_stats()
+    return {
+        'usernames': [f'bench{i}' for i in range(users)],
+        'blog_ids': blog_ids,
+        'tags': [f'bench-tag-{i}' for i in range(tags)],
+    }
+
+
+def _logged_in_client(username):
+    client = Client()
+    client.force_login(User.objects.get(username=username))
+    return client
+
+
+def scenarios(data):
+    """
+    Returns the benchmark scenarios for the generated data.
+
+    Each scenario is a function ``(rng) -> (client, method, url, params)``
+    describing the next request to send.
+    """
+    client = _logged_in_client(data['usernames'][0])
+
+    def home(rng):
+        return client, 'get', reverse('home'), None
+
+    def home_search(rng):
+        return client, 'get', reverse('home'), {'search': rng.choice(WORDS)}
+
+    def post(rng):
+        return client, 'get', reverse('post', args=[rng.choice(data['blog_ids'])]), None
+
+    def get_tags(rng):
+        return client, 'get', reverse('tags', args=[rng.choice(data['tags'])]), None
+
+    def add_comment(rng):
+        params = {'blog': rng.choice(data['blog_ids']), 'content': _text(rng, 20)}
+        return client, 'post', reverse('add_comment'), params
+
+    def log(rng):
+        # a fresh anonymous client each time, logging in is what is measured
+        params = {'username': rng.choice(data['usernames']), 'password': PASSWORD}
+        return Client(), 'post', reverse('login'), params
+
+    return {
+        'home': home,
+        'home_search': home_search,
+        'post': post,
+        'get_tags': get_tags,
+        'add_comment': add_comment,
+        'log': log,
+    }
+
+
+def run_scenario(scenario, requests=200, warmup=10, seed=0):
+    """
+    Sends ``requests`` requests of a scenario one after the other.
+
+    Returns:
+        dict: The requests/sec, the p50, p95 and p99 latency in milliseconds
+            and the mean number of queries per request.
+    """
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        client, method, url, params = scenario(rng)
+        getattr(client, method)(url, params)
+
+    latencies = []
+    queries = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        client, method, url, params = scenario(rng)
+        with CaptureQueriesContext(connection) as captured:
+            request_started = time.perf_counter()
+            response = getattr(client, method)(url, params)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method.upper()} {url} answered {response.status_code}')
+        queries += len(captured)
+    elapsed = time.perf_counter() - started
+
+    return _summary(latencies, round(queries / requests, 2), requests, elapsed)
+
+
+# the scenarios run concurrently, writes would only measure SQLite's lock
+READ_SCENARIOS = ('home', 'home_search', 'post', 'get_tags')
+
+
+def _summary(latencies, queries, requests, elapsed):
+    latencies.sort()
+    return {
+        'requests': requests,
+        'rps': round(requests / elapsed, 1),
+        'p50': round(percentile(latencies, 0.50), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+        'queries': queries,
+    }
+
+
+def run_concurrent(scenario, username, interface='wsgi', requests=200, concurrency=20, seed=0):
+    """
+    Sends ``requests`` requests of a read scenario from ``concurrency`` clients at once.
+
+    With ``'wsgi'`` every client is a thread going through the WSGI handler,
+    with ``'asgi'`` every client is a task on one event loop going through
+    the ASGI handler and the async views, each request in its own thread
+    sensitive context like under an ASGI server.
+
+    Returns:
+        dict: Like ``run_scenario``, without the query count.
+    """
+    rng = random.Random(seed)
+    targets = [scenario(rng)[1:] for _ in range(requests)]
+    batches = [targets[index::concurrency] for index in range(concurrency)]
+    user = User.objects.get(username=username)
+    latencies = []
+
+    def wsgi_client(client, batch):
+        try:
+            for method, url, params in batch:
+                started = time.perf_counter()
+                getattr(client, method)(url, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+
+    async def asgi_client(client, batch):
+        for method, url, params in batch:
+            started = time.perf_counter()
+            async with ThreadSensitiveContext():
+                await getattr(client, method)(url, params)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def asgi_clients(clients):
+        await asyncio.gather(*(asgi_client(client, batch) for client, batch in zip(clients, batches)))
+
+    # logging in writes the sessions, done one client after the other
+    clients = []
+    for _ in batches:
+        client = Client() if interface == 'wsgi' else AsyncClient()
+        client.force_login(user)
+        clients.append(client)
+
+    started = time.perf_counter()
+    if interface == 'wsgi':
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(wsgi_client, clients, batches))
+    else:
+        with override_settings(ROOT_URLCONF='blog.async_urls'):
+            asyncio.run(asgi_clients(clients))
+    return _summary(latencies, None, requests, time.perf_counter() - started)
+
+
+def load_baseline(path):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path, results):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+
+def regressions(results, baseline, tolerance=0.25):
+    """
+    Compares results with a baseline.
+
+    A scenario regresses when its p95 latency grows by more than
+    ``tolerance`` or when it runs more queries per request than before.
+    Latencies are noisy, query counts are not, hence the asymmetry.
+
+    Returns:
+        list: One message per regression.
+    """
+    found = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if result['p95'] > previous['p95'] * (1 + tolerance):
+            found.append(f"{name}: p95 {previous['p95']} ms -> {result['p95']} ms")
+        if result['queries'] is not None and result['queries'] > previous['queries']:
+            found.append(f"{name}: {previous['queries']} -> {result['queries']} queries per request")
+    return found
@@ -0,0 +1,161 @@
+"""
+Conditional GET support (ETag / Last-Modified) for the read-only blog views.
+
+Each page has a validator that reads a few aggregate values from the database
+- post dates, ``updated_at``, comment counters and the latest active comment -
+and turns them into an ETag and a Last-Modified date. When the client already
+holds the current version it gets a 304 before the view runs its queries or
+renders any template.
+
+The pages are personal (profile header, edit buttons, CSRF token, flash
+messages), so the ETag also covers the session, the user, the pending
+messages and what ``base.html`` shows around every page (the profile in the
+header, the tag cloud in the sidebar, the contact info in the footer), and the
+responses are marked private.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .fragments import fragment_version
+from .images import rendition_state
+from .models import Blog, Comment, ContactInfo
+from .tagstats import tag_cloud
+
+
+def _latest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def _feed_state(blogs, comments):
+    """
+    Aggregates the state of a set of posts shown as a feed.
+
+    Deleted posts and comments don't move any date, so the site-wide fragment
+    version (moved on every post and comment change) is part of the state.
+    """
+    updated = blogs.aggregate(updated=Max('updated_at'))['updated']
+    last_comment = comments.filter(active=True).aggregate(
+        last=Max('created_at')
+    )['last']
+    return _latest(updated, last_comment), (updated, last_comment, fragment_version())
+
+
+def feed_validator(request, *args, **kwargs):
+    """
+    Validator of the pages listing all posts (``home``, ``last_post``).
+    """
+    return _feed_state(Blog.objects.all(), Comment.objects.all())
+
+
+def tag_validator(request, tag):
+    """
+    Validator of the ``get_tags`` page.
+    """
+    return _feed_state(
+        Blog.objects.filter(tags__slug=tag), Comment.objects.filter(blog__tags__slug=tag)
+    )
+
+
+def post_validator(request, pk):
+    """
+    Validator of the ``post`` page: the post, its comments and its related posts.
+    """
+    state = Blog.objects.filter(pk=pk).aggregate(
+        updated=Max('updated_at'),
+        comments=Max('comment_count'),
+        last_comment=Max('comment__created_at', filter=Q(comment__active=True)),
+    )
+    if state['updated'] is None:
+        # missing post, let the view answer
+        return None, None
+    related = Blog.objects.filter(related_to_entries__blog_id=pk).aggregate(
+        updated=Max('updated_at'), posts=Count('id')
+    )
+    # moderating comments can change which ones show without moving a date
+    # or the counter, but it moves the fragment version of the post
+    return _latest(state['updated'], state['last_comment'], related['updated']), (
+        state['updated'], state['comments'], state['last_comment'],
+        related['updated'], related['posts'], fragment_version(pk),
+    )
+
+
+def _layout_state(request):
+    """
+    Returns the values ``base.html`` renders on every page.
+
+    They come from the cached user, tag cloud and contact info, the objects
+    the template reads, so they cost no query once those caches are warm.
+    """
+    profile = getattr(request.user, 'profile', None)
+    contact_info = ContactInfo.load()
+    return (
+        profile and (profile.name, profile.image.name, rendition_state(profile.image.name)),
+        tuple((tag['slug'], tag['name'], tag['post_count'], tag['weight']) for tag in tag_cloud()),
+        contact_info and tuple(getattr(contact_info, field.attname) for field in contact_info._meta.concrete_fields),
+    )
+
+
+def _conditional_values(request, validator, args, kwargs):
+    """
+    Returns ``(last_modified, etag)`` of a request, computed once.
+    """
+    # etag_func and last_modified_func both need them, and async views
+    # compute them ahead in a thread
+    if not hasattr(request, '_conditional_values'):
+        last_modified, state = validator(request, *args, **kwargs)
+        etag = None
+        if state is not None:
+            parts = (
+                request.session.session_key,
+                request.user.pk,
+                request.get_full_path(),
+                len(get_messages(request)),
+                _layout_state(request),
+                state,
+            )
+            digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+            etag = f'W/"{digest}"'
+        request._conditional_values = (last_modified, etag)
+    return request._conditional_values
+
+
+def conditional_page(validator):
+    """
+    Decorates a read-only view with ETag and Last-Modified handling.
+
+    Works on async views too: the validator, the session and the user are
+    then read in a thread before the conditional check.
+
+    Args:
+        validator (callable): Called with the view arguments, returns
+            ``(last_modified, state)`` where ``state`` is a tuple of the values
+            the page depends on, or ``(None, None)`` to skip the check.
+    """
+
+    def etag_func(request, *args, **kwargs):
+        return _conditional_values(request, validator, args, kwargs)[1]
+
+    def last_modified_func(request, *args, **kwargs):
+        return _conditional_values(request, validator, args, kwargs)[0]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        if iscoroutinefunction(view):
+            inner = conditional_view
+
+            @wraps(view)
+            async def conditional_view(request, *args, **kwargs):
+                await sync_to_async(_conditional_values)(request, validator, args, kwargs)
+                return await inner(request, *args, **kwargs)
+
+        return vary_on_cookie(cache_control(private=True, no_cache=True)(conditional_view))
+
+    return decorator
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .models import ContactInfo
+from .replicas import reading_replica
+from .tagstats import tag_cloud as cached_tag_cloud
+
+
+def fragment_cache(request):
+    """
+    Exposes the timeout of the cached template fragments.
+
+    Fragments rendered from a replica may predate the write that moved their
+    version, so they are kept for ``BLOG_REPLICA_FRAGMENT_CACHE_TIMEOUT`` only.
+    """
+    if reading_replica():
+        return {'FRAGMENT_CACHE_TIMEOUT': settings.BLOG_REPLICA_FRAGMENT_CACHE_TIMEOUT}
+    return {'FRAGMENT_CACHE_TIMEOUT': settings.BLOG_FRAGMENT_CACHE_TIMEOUT}
+
+
+def contact_info(request):
+    """
+    Exposes the site contact info as ``contact_info``, read only when a template uses it.
+    """
+    return {'contact_info': SimpleLazyObject(ContactInfo.load)}
+
+
+def tag_cloud(request):
+    """
+    Exposes the most used tags as ``tag_cloud``, read from the cache when a template uses it.
+    """
+    return {'tag_cloud': SimpleLazyObject(cached_tag_cloud)}
@@ -0,0 +1,46 @@
+"""
+Maintenance of the denormalized ``Blog.comment_count`` counter.
+
+The counter is moved with ``F()`` expressions by the Comment signals, and can
+be recomputed from the ``Comment`` table when it drifts.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Blog, Comment
+
+
+def adjust_comment_count(blog_id, delta):
+    """
+    Atomically adds ``delta`` to the comment counter of a blog.
+    """
+    if blog_id and delta:
+        Blog.objects.filter(pk=blog_id).update(comment_count=F('comment_count') + delta)
+
+
+def active_comment_count():
+    """
+    Returns a subquery counting the active comments of the outer blog.
+    """
+    counts = (
+        Comment.objects
+        .filter(blog=OuterRef('pk'), active=True)
+        .order_by()
+        .values('blog')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount_comments(blog_ids):
+    """
+    Recomputes the comment counters of the given blogs in one UPDATE.
+
+    Args:
+        blog_ids (iterable): The primary keys of the blogs to fix.
+
+    Returns:
+        int: The number of blogs updated.
+    """
+    return Blog.objects.filter(pk__in=list(blog_ids)).update(comment_count=active_comment_count())
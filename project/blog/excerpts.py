@@ -0,0 +1,53 @@
+"""
+Excerpts, word counts and reading times of the posts.
+
+They are computed when a post is saved (``Blog.save``) and stored on the row,
+so the feed cards never need to read the ``content`` column.
+"""
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_FIELDS = ('excerpt', 'word_count', 'reading_time')
+
+
+def summarize(content):
+    """
+    Returns ``(excerpt, word_count, reading_time)`` of a post content.
+
+    The excerpt is the first ``BLOG_EXCERPT_WORDS`` words and the reading
+    time is in minutes, at ``BLOG_WORDS_PER_MINUTE``.
+    """
+    text = strip_tags(content or '')
+    word_count = len(text.split())
+    excerpt = Truncator(text).words(settings.BLOG_EXCERPT_WORDS)
+    return excerpt, word_count, math.ceil(word_count / settings.BLOG_WORDS_PER_MINUTE)
+
+
+def backfill_excerpts(model, batch_size=500):
+    """
+    Recomputes the excerpt fields of every post, in batches of primary keys.
+
+    Works on the historical model of a migration as well, hence ``model``.
+
+    Args:
+        model (Model): The ``Blog`` model.
+        batch_size (int): Number of posts read and updated at a time.
+
+    Yields:
+        list: The primary keys of each batch once it is updated.
+    """
+    last_id = 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last_id).order_by('pk').only('pk', 'content')[:batch_size])
+        if not batch:
+            return
+        for blog in batch:
+            blog.excerpt, blog.word_count, blog.reading_time = summarize(blog.content)
+        with transaction.atomic():
+            model.objects.bulk_update(batch, EXCERPT_FIELDS)
+        last_id = batch[-1].pk
+        yield [blog.pk for blog in batch]
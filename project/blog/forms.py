@@ -5,7 +5,7 @@ from .models import Blog,ContactUs
 class BlogForm(forms.ModelForm):
     class Meta:
         model = Blog
-        exclude =['author']
+        exclude =['author', 'comment_count']
 
     def __init__(self, *args, **kwargs):
             super(BlogForm, self).__init__(*args, **kwargs)
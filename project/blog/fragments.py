@@ -0,0 +1,38 @@
+"""
+Versioning of the cached template fragments.
+
+Every post has a version stamp in the cache, and the ``{% cache %}`` blocks of
+the templates are keyed on it. Saving or deleting a post or one of its
+comments moves the stamp, so the old fragments are simply never read again.
+A site-wide stamp covers fragments that list other posts.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'blog:fragment-version:{}'
+ALL_POSTS = 'all'
+
+
+def _stamp():
+    return time.time_ns()
+
+
+def fragment_version(blog_id=ALL_POSTS):
+    """
+    Returns the version stamp of a post's fragments (or the site-wide one).
+
+    A missing stamp is created on the spot rather than defaulting to 0, so an
+    evicted stamp can never bring back fragments rendered before a change.
+    """
+    return cache.get_or_set(VERSION_KEY.format(blog_id), _stamp, timeout=None)
+
+
+def invalidate_fragments(*blog_ids):
+    """
+    Moves the version stamps of the given posts and the site-wide stamp.
+    """
+    stamp = _stamp()
+    keys = [VERSION_KEY.format(blog_id) for blog_id in blog_ids]
+    keys.append(VERSION_KEY.format(ALL_POSTS))
+    cache.set_many({key: stamp for key in keys}, timeout=None)
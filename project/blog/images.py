@@ -0,0 +1,240 @@
+"""
+Resized renditions of the uploaded images (``Blog.image``, ``Profile.image``).
+
+For an original stored as ``blog-images/photo.png`` the renditions are stored
+next to it as ``blog-images/renditions/photo.png-300.webp``,
+``blog-images/renditions/photo.png-300.jpg`` and so on, one per configured
+width and format, with a ``photo.png.json`` manifest listing the widths
+generated. The names keep the extension of the original, so ``photo.png``
+and ``photo.jpg`` don't share renditions. The
+``responsive_image`` template tag turns them into ``srcset`` attributes.
+
+Uploads are processed by the background worker: the view only queues a
+``process_image`` job and writes a pending manifest, and pages show a
+placeholder until the worker has stripped the metadata of the original and
+generated the renditions. When the image cannot be processed the pending
+manifest is dropped and pages show the original.
+"""
+import json
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .fragments import invalidate_fragments
+from .jobs import enqueue, enqueue_many
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = 'renditions'
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+CACHE_KEY = 'blog:image-renditions:{}'
+# How long a missing or pending manifest is remembered before the storage is
+# read again, the worker may have finished in another process meanwhile
+RECHECK_TIMEOUT = 60
+
+
+def _base(name):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, RENDITION_DIR, filename)
+
+
+def rendition_name(name, width, image_format):
+    """
+    Returns the storage name of one rendition of an image.
+    """
+    return f'{_base(name)}-{width}.{EXTENSIONS[image_format]}'
+
+
+def manifest_name(name):
+    return f'{_base(name)}.json'
+
+
+def _replace(storage, name, content):
+    # keep the predictable name instead of letting the storage add a suffix
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, content)
+
+
+def _encode(image, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, format=image_format.upper(), quality=settings.IMAGE_RENDITION_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_renditions(name, storage=default_storage):
+    """
+    Generates the renditions of an uploaded image and its manifest.
+
+    Widths larger than the original are skipped, the image is never upscaled.
+
+    Args:
+        name (str): The storage name of the original image.
+        storage (Storage): Where the original is and the renditions go.
+
+    Returns:
+        dict: The manifest (``widths`` and ``formats``), or None when the
+            file is missing or is not an image.
+    """
+    if not name:
+        return None
+    try:
+        with storage.open(name) as original:
+            image = Image.open(original)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as error:
+        logger.warning('Cannot generate renditions of %s: %s', name, error)
+        return None
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    widths = [width for width in settings.IMAGE_RENDITION_WIDTHS if width < image.width]
+    widths.append(min(image.width, max(settings.IMAGE_RENDITION_WIDTHS)))
+    widths = sorted(set(widths))
+    formats = list(settings.IMAGE_RENDITION_FORMATS)
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            _replace(storage, rendition_name(name, width, image_format), _encode(resized, image_format))
+
+    manifest = {'widths': widths, 'formats': formats}
+    _replace(storage, manifest_name(name), ContentFile(json.dumps(manifest).encode()))
+    cache.set(CACHE_KEY.format(name), manifest, timeout=None)
+    return manifest
+
+
+def get_renditions(name, storage=default_storage):
+    """
+    Returns the manifest of an image, or None when it has no renditions.
+
+    A manifest with ``pending`` set means the image is waiting for the worker.
+    The manifest is read from the cache, the storage is only read on a miss.
+    """
+    if not name:
+        return None
+    key = CACHE_KEY.format(name)
+    manifest = cache.get(key)
+    if manifest is None:
+        try:
+            with storage.open(manifest_name(name)) as manifest_file:
+                manifest = json.loads(manifest_file.read())
+        except (FileNotFoundError, OSError, ValueError):
+            manifest = {}
+        ready = bool(manifest.get('widths'))
+        cache.set(key, manifest, timeout=None if ready else RECHECK_TIMEOUT)
+    return manifest or None
+
+
+def rendition_state(name):
+    """
+    Returns ``'ready'``, ``'pending'`` or ``''`` for an image.
+    """
+    manifest = get_renditions(name)
+    if not manifest:
+        return ''
+    return 'pending' if manifest.get('pending') else 'ready'
+
+
+def strip_metadata(name, storage=default_storage):
+    """
+    Re-encodes an original image without its EXIF data, applying its orientation.
+
+    Animated images and formats Pillow cannot write are left untouched.
+    """
+    with storage.open(name) as original:
+        image = Image.open(original)
+        image_format = image.format
+        if getattr(image, 'is_animated', False) or image_format not in ('JPEG', 'PNG', 'WEBP'):
+            return
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    options = {'quality': 90} if image_format in ('JPEG', 'WEBP') else {}
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    _replace(storage, name, ContentFile(buffer.getvalue()))
+
+
+def process_image(name, blog_id=None):
+    """
+    Background job: cleans an uploaded image and generates its renditions.
+
+    Args:
+        name (str): The storage name of the uploaded image.
+        blog_id (int): The post showing the image, whose cached fragments
+            are dropped once the renditions are ready.
+    """
+    try:
+        strip_metadata(name)
+    except (UnidentifiedImageError, OSError) as error:
+        logger.warning('Cannot strip the metadata of %s: %s', name, error)
+    if generate_renditions(name) is None:
+        discard_pending(name)
+    if blog_id:
+        invalidate_fragments(blog_id)
+
+
+def discard_pending(name, blog_id=None, storage=default_storage):
+    """
+    Drops the pending manifest of an image that could not be processed.
+
+    Also called by the job queue when ``process_image`` has failed for good.
+    """
+    if storage.exists(manifest_name(name)):
+        storage.delete(manifest_name(name))
+    cache.delete(CACHE_KEY.format(name))
+    if blog_id:
+        invalidate_fragments(blog_id)
+
+
+process_image.on_failure = discard_pending
+
+
+def queue_image_processing(name, blog_id=None, storage=default_storage):
+    """
+    Queues the processing of an uploaded image and marks it as pending.
+    """
+    if not name:
+        return
+    manifest = {'pending': True}
+    _replace(storage, manifest_name(name), ContentFile(json.dumps(manifest).encode()))
+    cache.set(CACHE_KEY.format(name), manifest, timeout=RECHECK_TIMEOUT)
+    enqueue('blog.images.process_image', name=name, blog_id=blog_id)
+
+
+def queue_images_processing(images):
+    """
+    Queues the processing of many images, e.g. of an import, with one INSERT.
+
+    No pending manifest is written: until the worker is done the pages show
+    the originals rather than placeholders.
+
+    Args:
+        images (iterable): ``(name, blog_id)`` pairs.
+    """
+    enqueue_many('blog.images.process_image', [
+        {'name': name, 'blog_id': blog_id} for name, blog_id in images if name
+    ])
+
+
+def srcset(name, manifest, image_format, storage=default_storage):
+    """
+    Builds the ``srcset`` attribute value of one format.
+    """
+    return ', '.join(
+        f'{storage.url(rendition_name(name, width, image_format))} {width}w'
+        for width in manifest['widths']
+    )
@@ -0,0 +1,300 @@
+"""
+Request-scoped query and timing instrumentation.
+
+``RequestMetricsMiddleware`` measures every request through an execute
+wrapper installed on each database connection, which only records while a
+request is being measured:
+
+* the number of SQL queries, their total time and the duplicated ones,
+* the time spent rendering templates (through ``InstrumentedDjangoTemplates``),
+* the view time and the total time.
+
+The figures go out as a ``Server-Timing`` header and a structured log line on
+the ``blog.instrumentation`` logger, and samples are stored in batches in the
+``RequestSample`` table, whose admin page shows percentiles per URL name.
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    What one request cost.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = []
+        self.template_time = 0.0
+
+    def record_query(self, sql, params, duration):
+        self.queries.append((sql, repr(params), duration))
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        """
+        Returns the queries run more than once with the same parameters, with their count.
+        """
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return {key: count for key, count in counts.items() if count > 1}
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, params, time.perf_counter() - started)
+
+
+def instrument_connection(connection, **kwargs):
+    """
+    Installs ``_record_query`` on a connection, once.
+
+    The connections are per thread, and async views run their queries in the
+    threads of ``sync_to_async``, so the wrapper is set on every connection as
+    it is opened instead of on the connections of the request thread. The
+    request ContextVar follows the view into those threads.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(instrument_connection)
+
+
+class InstrumentedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing every top-level template render.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class SampleBuffer:
+    """
+    Collects request samples in memory and writes them with one bulk insert.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+        self.last_flush = time.monotonic()
+
+    def add(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+            due = (
+                len(self.samples) >= settings.REQUEST_METRICS_FLUSH_SIZE
+                or time.monotonic() - self.last_flush >= settings.REQUEST_METRICS_FLUSH_INTERVAL
+            )
+            if not due:
+                return
+            samples, self.samples = self.samples, []
+            self.last_flush = time.monotonic()
+        self.flush(samples)
+
+    def flush(self, samples):
+        from .models import RequestSample
+
+        try:
+            RequestSample.objects.bulk_create(samples)
+            limit = timezone.now() - timedelta(days=settings.REQUEST_METRICS_RETENTION_DAYS)
+            RequestSample.objects.filter(created_at__lt=limit).delete()
+        except Exception:
+            logger.exception('Could not store %d request samples', len(samples))
+
+
+buffer = SampleBuffer()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures every request, see the module docstring.
+
+    Put it first in ``MIDDLEWARE`` so the queries of the other middleware
+    (sessions, authentication) are counted too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @contextmanager
+    def measure(self):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            # connections opened before this module was loaded
+            for connection in connections.all():
+                instrument_connection(connection)
+            yield metrics
+        finally:
+            _current.reset(token)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REQUEST_METRICS_ENABLED:
+            return self.get_response(request)
+        with self.measure() as metrics:
+            response = self.get_response(request)
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_METRICS_ENABLED:
+            return await self.get_response(request)
+        with self.measure() as metrics:
+            response = await self.get_response(request)
+        # storing the samples may write to the database
+        await sync_to_async(self.report)(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            # the view time runs until the response is back here, so it
+            # includes the response phase of the middleware below this one
+            metrics.view_started = time.perf_counter()
+        return None
+
+    def report(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        view = time.perf_counter() - metrics.view_started if metrics.view_started else 0.0
+        duplicates = metrics.duplicates()
+        duplicate_count = sum(count - 1 for count in duplicates.values())
+        sql_time = metrics.sql_time
+        response.headers['Server-Timing'] = ', '.join([
+            f'sql;dur={sql_time * 1000:.1f};desc="{len(metrics.queries)} queries, {duplicate_count} duplicates"',
+            f'tpl;dur={metrics.template_time * 1000:.1f};desc="templates"',
+            f'view;dur={view * 1000:.1f};desc="view"',
+            f'total;dur={total * 1000:.1f};desc="total"',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else ''
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'view_ms': round(view * 1000, 2),
+            'sql_ms': round(sql_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'queries': len(metrics.queries),
+            'duplicates': duplicate_count,
+        }
+        logger.info(json.dumps(line), extra={'metrics': line})
+        if duplicates:
+            (sql, params), count = max(duplicates.items(), key=lambda item: item[1])
+            logger.warning('%s ran %d duplicate queries, e.g. %dx %s', request.path, duplicate_count, count, sql)
+
+        if url_name and random.random() < settings.REQUEST_METRICS_SAMPLE_RATE:
+            from .models import RequestSample
+
+            buffer.add(RequestSample(
+                url_name=url_name,
+                status=response.status_code,
+                total_ms=line['total_ms'],
+                view_ms=line['view_ms'],
+                sql_ms=line['sql_ms'],
+                template_ms=line['template_ms'],
+                queries=line['queries'],
+                duplicates=duplicate_count,
+            ))
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a sorted list.
+    """
+    if not values:
+        return None
+    index = max(0, math.ceil(fraction * len(values)) - 1)
+    return values[index]
+
+
+def url_percentiles(window=None):
+    """
+    Summarizes the latest samples of each URL name.
+
+    Args:
+        window (int): How many of the latest samples of each URL name to use.
+            Defaults to the ``REQUEST_METRICS_WINDOW`` setting.
+
+    Returns:
+        list: One dict per URL name with the sample count, the p50, p95 and
+            p99 of the total time and the mean number of queries.
+    """
+    from .models import RequestSample
+
+    if window is None:
+        window = settings.REQUEST_METRICS_WINDOW
+    rows = []
+    url_names = RequestSample.objects.order_by('url_name').values_list('url_name', flat=True).distinct()
+    for url_name in url_names:
+        samples = list(
+            RequestSample.objects.filter(url_name=url_name)
+            .order_by('-id')
+            .values_list('total_ms', 'queries')[:window]
+        )
+        totals = sorted(total for total, _ in samples)
+        rows.append({
+            'url_name': url_name,
+            'count': len(samples),
+            'p50': percentile(totals, 0.50),
+            'p95': percentile(totals, 0.95),
+            'p99': percentile(totals, 0.99),
+            'queries': sum(queries for _, queries in samples) / len(samples),
+        })
+    return rows
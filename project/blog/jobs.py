@@ -0,0 +1,139 @@
+"""
+A small database-backed job queue.
+
+Jobs are rows of the ``Job`` table naming a function by its dotted path and
+the keyword arguments to call it with. The ``run_worker`` management command
+claims and runs them outside the request cycle, so no external broker is
+needed. A job is claimed with a conditional ``UPDATE``, which works the same
+on SQLite and PostgreSQL and lets several workers share the table.
+
+A task can have an ``on_failure`` attribute, a function called with the same
+arguments once its job has failed for good, to undo what the queuing did.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, **payload):
+    """
+    Queues a call of ``task(**payload)`` for the worker.
+
+    Args:
+        task (str): The dotted path of the function to call.
+        **payload: JSON-serializable keyword arguments for the function.
+
+    Returns:
+        Job: The queued job.
+    """
+    return Job.objects.create(task=task, payload=payload)
+
+
+def enqueue_many(task, payloads):
+    """
+    Queues one call of ``task`` per payload, with a single INSERT.
+
+    Args:
+        task (str): The dotted path of the function to call.
+        payloads (iterable): The keyword arguments of each call.
+
+    Returns:
+        list: The queued jobs.
+    """
+    return Job.objects.bulk_create([Job(task=task, payload=payload) for payload in payloads])
+
+
+def claim_next():
+    """
+    Claims the next job that is due, or returns None when there is none.
+    """
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for job_id in candidates:
+        claimed = Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records the outcome.
+
+    A failing job is retried with an exponential backoff until it has used
+    ``JOB_MAX_ATTEMPTS`` attempts, then it is marked as failed.
+
+    Returns:
+        bool: Whether the job succeeded.
+    """
+    try:
+        import_string(job.task)(**job.payload)
+    except Exception:
+        logger.exception('Job %s (%s) failed', job.id, job.task)
+        job.last_error = traceback.format_exc()
+        if job.attempts < settings.JOB_MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+        job.save(update_fields=['status', 'run_after', 'last_error'])
+        if job.status == Job.FAILED:
+            _give_up(job)
+        return False
+    job.status = Job.DONE
+    job.save(update_fields=['status'])
+    return True
+
+
+def _give_up(job):
+    try:
+        on_failure = getattr(import_string(job.task), 'on_failure', None)
+        if on_failure:
+            on_failure(**job.payload)
+    except Exception:
+        logger.exception('Failure handler of job %s (%s) failed', job.id, job.task)
+
+
+def requeue_stale(timeout=None):
+    """
+    Puts back the jobs left running by a worker that died.
+
+    Returns:
+        int: The number of jobs requeued.
+    """
+    if timeout is None:
+        timeout = settings.JOB_STALE_TIMEOUT
+    limit = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=limit).update(status=Job.PENDING)
+
+
+def run_pending(max_jobs=None):
+    """
+    Runs due jobs until the queue is empty or ``max_jobs`` have run.
+
+    Returns:
+        int: The number of jobs run.
+    """
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.excerpts import backfill_excerpts
+from blog.fragments import invalidate_fragments
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored excerpt, word count and reading time of every post, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts read and updated at a time.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = 0
+        for blog_ids in backfill_excerpts(Blog, batch_size=options['batch_size']):
+            # the feed cards show the excerpt
+            invalidate_fragments(*blog_ids)
+            total += len(blog_ids)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated the excerpts of {total} blogs in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,125 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from blog import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the blog and accounts endpoints on a throwaway database filled '
+        'with synthetic data, and flags regressions against a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--blogs', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Number of measured requests per scenario.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Run only this scenario (repeatable).',
+        )
+        parser.add_argument(
+            '--compare-sessions', action='store_true',
+            help='Run the scenarios once per SESSION_ENGINES mode (db, cached_db, signed_cookies).',
+        )
+        parser.add_argument(
+            '--compare-interfaces', action='store_true',
+            help='Run the read scenarios concurrently through WSGI (sync views) and ASGI (async views).',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Number of concurrent clients of --compare-interfaces.',
+        )
+        parser.add_argument(
+            '--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'),
+            help='JSON file holding the reference results.',
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Store these results as the new baseline.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed p95 latency growth before a scenario is flagged, 0.25 is 25%%.',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # keep the benchmark keys apart from the ones of the site
+        caches = {alias: {**config, 'KEY_PREFIX': 'benchmark'} for alias, config in settings.CACHES.items()}
+        try:
+            # the scenarios replay the same client far above the rate limits
+            with override_settings(CACHES=caches, RATELIMIT_ENABLED=False):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['save_baseline']:
+            benchmark.save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}."))
+            return
+        found = benchmark.regressions(
+            results, benchmark.load_baseline(options['baseline']), options['tolerance']
+        )
+        if found:
+            raise CommandError('Performance regressions:\n' + '\n'.join(found))
+        self.stdout.write(self.style.SUCCESS('No regression against the baseline.'))
+
+    def run(self, options):
+        started = time.monotonic()
+        data = benchmark.generate_data(
+            users=options['users'], blogs=options['blogs'],
+            comments=options['comments'], tags=options['tags'],
+        )
+        self.stdout.write(f'Generated the data in {time.monotonic() - started:.2f}s.')
+
+        names = options['scenarios'] or list(benchmark.scenarios(data))
+        modes = list(settings.SESSION_ENGINES) if options['compare_sessions'] else [None]
+
+        self.stdout.write(f"{'scenario':<28} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+        results = {}
+        for mode in modes:
+            engine = settings.SESSION_ENGINES[mode] if mode else settings.SESSION_ENGINE
+            with override_settings(SESSION_ENGINE=engine):
+                # the clients log in again with the session engine of the mode
+                available = benchmark.scenarios(data)
+                unknown = set(names) - set(available)
+                if unknown:
+                    raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+                for name in names:
+                    key = f'{name}@{mode}' if mode else name
+                    result = benchmark.run_scenario(available[name], requests=options['requests'])
+                    results[key] = result
+                    self.stdout.write(
+                        f"{key:<28} {result['rps']:>8} {result['p50']:>8} {result['p95']:>8} "
+                        f"{result['p99']:>8} {result['queries']:>8}"
+                    )
+
+        if options['compare_interfaces']:
+            available = benchmark.scenarios(data)
+            for name in names:
+                if name not in benchmark.READ_SCENARIOS:
+                    continue
+                for interface in ('wsgi', 'asgi'):
+                    key = f"{name}@{interface}x{options['concurrency']}"
+                    result = benchmark.run_concurrent(
+                        available[name], data['usernames'][0], interface=interface,
+                        requests=options['requests'], concurrency=options['concurrency'],
+                    )
+                    results[key] = result
+                    self.stdout.write(
+                        f"{key:<28} {result['rps']:>8} {result['p50']:>8} {result['p95']:>8} "
+                        f"{result['p99']:>8} {'-':>8}"
+                    )
+        return results
@@ -0,0 +1,53 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.archive import export_images, export_records, write_records
+
+
+class Command(BaseCommand):
+    help = 'Writes every post as NDJSON or CSV, to be loaded back with import_blogs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, - for the standard output.')
+        parser.add_argument(
+            '--format', choices=['ndjson', 'csv'],
+            help='Defaults to the extension of the file, else ndjson.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts read at a time.',
+        )
+        parser.add_argument(
+            '--images-dir',
+            help='Also copy the images into this directory, for import_blogs --images-dir.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Number of threads copying the images.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        started = time.monotonic()
+        images = []
+
+        def records():
+            for record in export_records(batch_size=options['batch_size']):
+                images.append(record['image'])
+                yield record
+
+        if path == '-':
+            count = write_records(sys.stdout, fmt, records())
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                count = write_records(stream, fmt, records())
+        if options['images_dir']:
+            export_images(images, options['images_dir'], workers=options['workers'])
+        elapsed = time.monotonic() - started
+        # the report goes to stderr, stdout may be the export itself
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {count} blogs in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f} rows/s).'
+        ))
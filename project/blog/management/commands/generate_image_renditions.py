@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Profile
+from blog.images import generate_renditions, get_renditions
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized renditions of the existing blog and profile images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate the renditions of images that already have them.',
+        )
+
+    def handle(self, *args, **options):
+        names = set(Blog.objects.exclude(image='').values_list('image', flat=True))
+        names |= set(Profile.objects.exclude(image='').values_list('image', flat=True))
+        started = time.monotonic()
+        generated = skipped = failed = 0
+        for name in sorted(names):
+            # pending images are the ones whose job got stuck or lost
+            if not options['force'] and (get_renditions(name) or {}).get('widths'):
+                skipped += 1
+            elif generate_renditions(name):
+                generated += 1
+            else:
+                failed += 1
+                self.stderr.write(f'Could not process {name}')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated renditions of {generated} images in {elapsed:.2f}s '
+            f'({skipped} already done, {failed} failed).'
+        ))
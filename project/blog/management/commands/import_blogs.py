@@ -0,0 +1,58 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.archive import import_blogs, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates posts, with their missing authors and tags, from an NDJSON or '
+        'CSV file written by export_blogs, in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, - for the standard input.')
+        parser.add_argument(
+            '--format', choices=['ndjson', 'csv'],
+            help='Defaults to the extension of the file, else ndjson.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts written per transaction.',
+        )
+        parser.add_argument(
+            '--images-dir',
+            help='Directory the image paths are relative to, the files are copied into the storage. '
+                 'Without it the paths must already be in the storage.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Number of threads copying the images.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+
+        def progress(count, elapsed):
+            self.stdout.write(f'{count} blogs imported, {count / max(elapsed, 1e-9):.0f} rows/s')
+
+        try:
+            if path == '-':
+                count = self.load(sys.stdin, fmt, options, progress)
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    count = self.load(stream, fmt, options, progress)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Import failed, the batches before it are kept: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Imported {count} blogs.'))
+
+    def load(self, stream, fmt, options, progress):
+        return import_blogs(
+            read_records(stream, fmt),
+            batch_size=options['batch_size'],
+            images_dir=options['images_dir'],
+            workers=options['workers'],
+            progress=progress,
+        )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.related import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the related posts of every blog from their tags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of related post rows inserted at a time.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_related_posts(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {count} related posts in {elapsed:.2f}s.'
+        ))
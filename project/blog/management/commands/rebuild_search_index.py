@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of the blog posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts read from the database at a time.',
+        )
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        started = time.monotonic()
+        count = backend.rebuild(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} posts with the {backend.name} backend in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.tagstats import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the post count and latest post date of every tag.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_tag_stats()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored the statistics of {count} tags in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.counters import recount_comments
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Blog.comment_count from the active comments, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of blogs recounted per UPDATE.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Blog.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                total += recount_comments(batch)
+            last_id = batch[-1]
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted comments of {total} blogs in {elapsed:.2f}s.'
+        ))
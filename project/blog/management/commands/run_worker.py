@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.jobs import requeue_stale, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued background jobs (image processing, ...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run the jobs that are due, then exit.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty.',
+        )
+        parser.add_argument(
+            '--max-jobs', type=int, default=None,
+            help='Exit after running this many jobs.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            requeued = requeue_stale()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale jobs.')
+            remaining = None if options['max_jobs'] is None else options['max_jobs'] - total
+            count = run_pending(max_jobs=remaining)
+            total += count
+            if options['once'] or (options['max_jobs'] is not None and total >= options['max_jobs']):
+                break
+            if not count:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} jobs.'))
@@ -0,0 +1,87 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE blog_blog_fts USING fts5(title, content, tokenize='unicode61')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5, the SearchTerm table is used instead
+            populate_search_terms(apps)
+        else:
+            schema_editor.execute(
+                'INSERT INTO blog_blog_fts(rowid, title, content) SELECT id, title, content FROM blog_blog'
+            )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE blog_blog ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED"
+        )
+        schema_editor.execute(
+            'CREATE INDEX blog_blog_search_vector_idx ON blog_blog USING GIN (search_vector)'
+        )
+    else:
+        populate_search_terms(apps)
+
+
+def populate_search_terms(apps):
+    from blog.search import CONTENT_WEIGHT, TITLE_WEIGHT, tokenize
+
+    Blog = apps.get_model('blog', 'Blog')
+    SearchTerm = apps.get_model('blog', 'SearchTerm')
+    terms = []
+    for blog in Blog.objects.only('id', 'title', 'content').iterator():
+        weights = {}
+        for token in tokenize(blog.title):
+            weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(blog.content):
+            weights[token] = weights.get(token, 0) + CONTENT_WEIGHT
+        terms.extend(
+            SearchTerm(blog_id=blog.id, term=term, weight=weight)
+            for term, weight in weights.items() if len(term) <= 100
+        )
+    SearchTerm.objects.bulk_create(terms, batch_size=500)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS blog_blog_fts')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE blog_blog DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_alter_contactus_subject'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='contactinfo',
+            options={'verbose_name_plural': 'Contact Info'},
+        ),
+        migrations.AlterModelOptions(
+            name='contactus',
+            options={'verbose_name_plural': 'Contact Us'},
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=100)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='blog.blog')),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
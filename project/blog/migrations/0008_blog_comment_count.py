@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:29
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_comments(apps, schema_editor):
+    Blog = apps.get_model('blog', 'Blog')
+    Comment = apps.get_model('blog', 'Comment')
+    counts = (
+        Comment.objects.filter(blog=OuterRef('pk'), active=True)
+        .order_by().values('blog').annotate(count=Count('id')).values('count')
+    )
+    Blog.objects.update(comment_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_active_comments, migrations.RunPython.noop),
+    ]
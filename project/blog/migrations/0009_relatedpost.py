@@ -0,0 +1,81 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:30
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_related_posts(apps, schema_editor):
+    """
+    Ranks the neighbours of every post by the Jaccard similarity of their tag
+    sets, a copy of blog.related.rebuild_related_posts on the historical models.
+    """
+    Blog = apps.get_model('blog', 'Blog')
+    RelatedPost = apps.get_model('blog', 'RelatedPost')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    existing = set(Blog.objects.values_list('id', flat=True))
+    items = TaggedItem.objects.filter(content_type__app_label='blog', content_type__model='blog')
+    tag_sets = defaultdict(set)
+    posts_by_tag = defaultdict(set)
+    for blog_id, tag_id in items.values_list('object_id', 'tag_id').iterator():
+        if blog_id in existing:
+            tag_sets[blog_id].add(tag_id)
+            posts_by_tag[tag_id].add(blog_id)
+
+    rows = []
+    for blog_id, tags in tag_sets.items():
+        shared = defaultdict(int)
+        for tag_id in tags:
+            for other_id in posts_by_tag[tag_id]:
+                if other_id != blog_id:
+                    shared[other_id] += 1
+        scored = sorted(
+            (
+                (count / (len(tags) + len(tag_sets[other_id]) - count), other_id)
+                for other_id, count in shared.items()
+            ),
+            # best score first, newer posts first on ties
+            key=lambda item: (-item[0], -item[1]),
+        )
+        rows.extend(
+            RelatedPost(blog_id=blog_id, related_id=other_id, score=score, rank=rank)
+            for rank, (score, other_id) in enumerate(scored[:settings.BLOG_RELATED_POSTS])
+        )
+        if len(rows) >= BATCH_SIZE:
+            RelatedPost.objects.bulk_create(rows)
+            rows = []
+    RelatedPost.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_blog_comment_count'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='blog.blog')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to_entries', to='blog.blog')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedpost',
+            constraint=models.UniqueConstraint(fields=('blog', 'rank'), name='blog_relatedpost_blog_rank'),
+        ),
+        migrations.RunPython(fill_related_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:33
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_creation_date(apps, schema_editor):
+    Blog = apps.get_model('blog', 'Blog')
+    Blog.objects.update(updated_at=F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_relatedpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_creation_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(max_length=100)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('total_ms', models.FloatField()),
+                ('view_ms', models.FloatField()),
+                ('sql_ms', models.FloatField()),
+                ('template_ms', models.FloatField()),
+                ('queries', models.PositiveIntegerField()),
+                ('duplicates', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['url_name', '-id'], name='blog_reqsample_url_name_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def move_first_row(apps, schema_editor):
+    # the contact page showed the first row, it becomes the singleton row
+    ContactInfo = apps.get_model('blog', 'ContactInfo')
+    if ContactInfo.objects.filter(pk=1).exists():
+        return
+    first = ContactInfo.objects.order_by('pk').first()
+    if first is not None:
+        ContactInfo.objects.filter(pk=first.pk).update(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_first_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+from blog.excerpts import backfill_excerpts
+
+
+def fill_excerpts(apps, schema_editor):
+    Blog = apps.get_model('blog', 'Blog')
+    for _ in backfill_excerpts(Blog):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_contactinfo_singleton'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
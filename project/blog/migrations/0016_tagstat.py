@@ -0,0 +1,57 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+
+def fill_tag_stats(apps, schema_editor):
+    """
+    One grouped query over the tagged posts, like blog.tagstats.rebuild_tag_stats.
+
+    The historical models have no generic relation, the dates are joined with
+    a subquery on the object ids.
+    """
+    Blog = apps.get_model('blog', 'Blog')
+    TagStat = apps.get_model('blog', 'TagStat')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    posts = Blog.objects.filter(id=OuterRef('object_id'))
+    rows = (
+        TaggedItem.objects
+        .filter(content_type__app_label='blog', content_type__model='blog')
+        .annotate(date=Subquery(posts.values('date')))
+        .filter(date__isnull=False)
+        .values('tag_id')
+        .annotate(post_count=Count('object_id', distinct=True), latest_post_date=Max('date'))
+        .order_by()
+    )
+    TagStat.objects.bulk_create(
+        [
+            TagStat(tag_id=row['tag_id'], post_count=row['post_count'], latest_post_date=row['latest_post_date'])
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_blog_excerpt'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStat',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='taggit.tag')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('latest_post_date', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-post_count', '-tag'], name='blog_tagstat_popular')],
+            },
+        ),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+    ]
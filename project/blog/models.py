@@ -1,7 +1,14 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from taggit.managers import TaggableManager
 from taggit.models import Tag
+
+from .excerpts import EXCERPT_FIELDS, summarize
 # Create your models here.
 
 class Blog(models.Model):
@@ -10,7 +17,31 @@ class Blog(models.Model):
     content = models.TextField()
     image = models.ImageField(upload_to='blog-images/')
     date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     tags = TaggableManager()
+    # number of active comments, maintained by the Comment signals
+    comment_count = models.PositiveIntegerField(default=0)
+    # derived from the content on save, the feeds show them instead of it
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)  # minutes
+
+    class Meta:
+        indexes = [
+            # the feeds page by (date, id) and last_post takes the latest date
+            models.Index(fields=['-date', '-id'], name='blog_blog_date_id'),
+            # Max('updated_at') of the conditional GET validators
+            models.Index(fields=['updated_at'], name='blog_blog_updated_at'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # a post loaded without its content keeps its stored excerpt
+        if 'content' not in self.get_deferred_fields():
+            self.excerpt, self.word_count, self.reading_time = summarize(self.content)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = {*update_fields, *EXCERPT_FIELDS}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -23,11 +54,78 @@ class Comment(models.Model):
     active = models.BooleanField(default=False)
     blog = models.ForeignKey(Blog,on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # when a moderator approved or rejected it, see moderation.py
+    moderated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the admin moderation queue, filtered on active and by date
+            models.Index(fields=['active', '-created_at'], name='blog_comment_moderation'),
+            # only active comments are ever listed or dated, so the indexes
+            # leave the others out
+            models.Index(
+                fields=['blog', '-id'], name='blog_comment_active_blog_id',
+                condition=models.Q(active=True),
+            ),
+            # Max('created_at') of the feed validators
+            models.Index(
+                fields=['created_at'], name='blog_comment_active_created_at',
+                condition=models.Q(active=True),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what the blog comment counter currently includes
+        instance._counted = (instance.__dict__.get('blog_id'), instance.__dict__.get('active'))
+        return instance
 
     def __str__(self):
         return f"commented by {self.user.username}"
 
 
+class RelatedPost(models.Model):
+    blog = models.ForeignKey(Blog,on_delete=models.CASCADE,related_name='related_entries')
+    related = models.ForeignKey(Blog,on_delete=models.CASCADE,related_name='related_to_entries')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['blog', 'rank'], name='blog_relatedpost_blog_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.related} related to {self.blog}"
+
+
+class TagStat(models.Model):
+    # maintained by tagstats.py, one row per tag used by at least one post
+    tag = models.OneToOneField(Tag,on_delete=models.CASCADE,primary_key=True,related_name='stat')
+    post_count = models.PositiveIntegerField(default=0)
+    latest_post_date = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # the tag listing and the tag cloud, most used first
+            models.Index(fields=['-post_count', '-tag'], name='blog_tagstat_popular'),
+        ]
+
+    def __str__(self):
+        return f"{self.tag} ({self.post_count})"
+
+
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=100, db_index=True)
+    blog = models.ForeignKey(Blog,on_delete=models.CASCADE,related_name='search_terms')
+    weight = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return self.term
+
+
 class ContactInfo(models.Model):
     map = models.CharField(max_length=250,blank=True,null=True)
     address = models.TextField()
@@ -37,9 +135,45 @@ class ContactInfo(models.Model):
     twitter = models.CharField(max_length=250)
     instagram = models.CharField(max_length=250)
     youtube = models.CharField(max_length=50)
+
+    # the single row, read through the shared cache and a copy kept per process
+    SINGLETON_PK = 1
+    CACHE_KEY = 'blog:contact-info'
+    _local = None  # (expires, instance or None)
+
     class Meta:
         verbose_name_plural = 'Contact Info'
-    
+
+    def save(self, *args, **kwargs):
+        self.pk = self.SINGLETON_PK
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def load(cls):
+        """
+        Returns the contact info, or None when it was never filled in the admin.
+
+        The process copy is trusted for ``CONTACT_INFO_LOCAL_TIMEOUT`` seconds,
+        the shared cache until the row is saved or deleted, so the row is read
+        from ``default``: a lagging replica would cache the old info for good.
+        """
+        local = cls._local
+        if local is not None and local[0] > time.monotonic():
+            return local[1]
+        # the cached value is a list so that a missing row is cached too
+        cached = cache.get(cls.CACHE_KEY)
+        if cached is None:
+            cached = list(cls.objects.using('default').filter(pk=cls.SINGLETON_PK))
+            cache.set(cls.CACHE_KEY, cached, timeout=None)
+        instance = cached[0] if cached else None
+        cls._local = (time.monotonic() + settings.CONTACT_INFO_LOCAL_TIMEOUT, instance)
+        return instance
+
+    @classmethod
+    def invalidate(cls):
+        cls._local = None
+        cache.delete(cls.CACHE_KEY)
+
 
 
 class ContactUs(models.Model):
@@ -52,3 +186,56 @@ class ContactUs(models.Model):
     def __str__(self):
         return self.subject
 
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # dotted path of the function to call, e.g. 'blog.images.process_image'
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='blog_job_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+
+class RequestSample(models.Model):
+    """
+    The measurements of one request, written by ``RequestMetricsMiddleware``.
+    """
+    url_name = models.CharField(max_length=100)
+    status = models.PositiveSmallIntegerField()
+    total_ms = models.FloatField()
+    view_ms = models.FloatField()
+    sql_ms = models.FloatField()
+    template_ms = models.FloatField()
+    queries = models.PositiveIntegerField()
+    duplicates = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['url_name', '-id'], name='blog_reqsample_url_name_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.url_name} {self.total_ms:.1f} ms"
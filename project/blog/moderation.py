@@ -0,0 +1,35 @@
+"""
+Moderation of the comments.
+
+With ``BLOG_COMMENT_MODERATION`` on, new comments are saved inactive and wait
+for a moderator. Approving or rejecting a selection of comments is one
+``UPDATE`` of the comments and one ``UPDATE`` of the comment counters of
+their posts, whatever the number of comments: ``QuerySet.update`` sends no
+signals, so the counters and the cached fragments are refreshed here.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import recount_comments
+from .fragments import invalidate_fragments
+
+
+def moderate(comments, approve):
+    """
+    Approves or rejects comments in bulk.
+
+    Rejected comments stay in the table, inactive, with their moderation date.
+
+    Args:
+        comments (QuerySet): The comments to moderate.
+        approve (bool): True to show them, False to hide them.
+
+    Returns:
+        int: The number of comments moderated.
+    """
+    with transaction.atomic():
+        blog_ids = list(comments.order_by().values_list('blog_id', flat=True).distinct())
+        count = comments.update(active=approve, moderated_at=timezone.now())
+        recount_comments(blog_ids)
+    invalidate_fragments(*blog_ids)
+    return count
@@ -0,0 +1,186 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``COUNT(*)`` and ``OFFSET`` like ``django.core.paginator``, a page is
+fetched with a ``WHERE`` on the ordering columns of the last row seen, so page
+100 costs the same as page 1. The position is handed to the client as an
+opaque, URL-safe cursor token.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class CursorPage:
+    """
+    One page of results returned by ``CursorPaginator.get_page``.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset on a unique ordering, e.g. ``('-date', '-id')``.
+
+    Args:
+        queryset (QuerySet): The objects to paginate.
+        per_page (int): The number of objects on each page.
+        ordering (tuple): Field names (or annotations) with an optional ``-``
+            prefix. Together they must be unique, so end with the primary key.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-date', '-id')):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    def get_page(self, cursor=None):
+        """
+        Returns the page that starts at ``cursor``.
+
+        An empty or invalid cursor returns the first page.
+
+        Args:
+            cursor (str): A token taken from ``next_cursor`` or ``previous_cursor``.
+
+        Returns:
+            CursorPage: The page of objects.
+        """
+        position = self.decode(cursor)
+        if position is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page],
+                next_cursor=self.encode(rows[self.per_page - 1]) if len(rows) > self.per_page else None,
+            )
+
+        values, backwards = position
+        if not backwards:
+            rows = list(
+                self.queryset.filter(self._beyond(values, backwards=False))
+                .order_by(*self.ordering)[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return CursorPage(
+                rows,
+                next_cursor=self.encode(rows[-1]) if has_more else None,
+                previous_cursor=self.encode(rows[0], backwards=True) if rows else None,
+            )
+
+        reversed_ordering = [
+            name if descending else f'-{name}' for name, descending in self.fields
+        ]
+        rows = list(
+            self.queryset.filter(self._beyond(values, backwards=True))
+            .order_by(*reversed_ordering)[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode(rows[-1]) if rows else None,
+            previous_cursor=self.encode(rows[0], backwards=True) if has_more else None,
+        )
+
+    def _beyond(self, values, backwards):
+        """
+        Builds the keyset condition selecting the rows after (or before) a position.
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, (previous_name, _) in enumerate(self.fields[:index]):
+                step &= Q(**{previous_name: values[previous]})
+            condition |= step
+        if len(self.fields) > 1:
+            # redundant bound on the leading field, so the database walks a
+            # range of the (date, id) index instead of OR-ing two index scans
+            name, descending = self.fields[0]
+            lookup = 'lte' if descending != backwards else 'gte'
+            condition &= Q(**{f'{name}__{lookup}': values[0]})
+        return condition
+
+    def _attname(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name).attname
+        except FieldDoesNotExist:
+            return name
+
+    def encode(self, obj, backwards=False):
+        """
+        Builds the opaque cursor token pointing at ``obj``.
+        """
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, self._attname(name))
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        payload = json.dumps({'v': values, 'b': int(backwards)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """
+        Reads a cursor token back into ``(values, backwards)``.
+
+        Returns:
+            tuple: The position, or None when the token is empty or malformed.
+        """
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            raw_values = payload['v']
+            if len(raw_values) != len(self.fields):
+                return None
+            values = []
+            for (name, _), value in zip(self.fields, raw_values):
+                if not isinstance(value, (str, int, float)):
+                    return None
+                try:
+                    field = self.queryset.model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    # an annotation, like the search_rank of the search results
+                    annotation = self.queryset.query.annotations[name]
+                    values.append(annotation.output_field.to_python(value))
+                else:
+                    values.append(field.target_field.to_python(value) if field.is_relation else field.to_python(value))
+            if None in values:
+                # the ordering columns are never NULL, and a NULL bound is not a valid filter
+                return None
+            return values, bool(payload.get('b'))
+        except (ValueError, TypeError, KeyError, AttributeError, ValidationError):
+            return None
@@ -0,0 +1,169 @@
+"""
+Precomputed related posts.
+
+For every post the ``RelatedPost`` table holds its top ``BLOG_RELATED_POSTS``
+neighbours ranked by the Jaccard similarity of their tag sets, so the post
+page reads them with one indexed lookup instead of a DISTINCT over the taggit
+through table.
+
+When the tags of a post change, the view refreshes that post right away and
+queues the refresh of the posts sharing its tags for the background worker:
+with a popular tag they can be most of the table.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from taggit.models import TaggedItem
+
+from .fragments import invalidate_fragments
+from .jobs import enqueue
+from .models import Blog, RelatedPost
+
+
+def _tagged_items():
+    return TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Blog))
+
+
+def _tag_sets(blog_ids=None):
+    """
+    Returns the tag ids of each post, as ``{blog_id: {tag_id, ...}}``.
+    """
+    items = _tagged_items()
+    if blog_ids is not None:
+        items = items.filter(object_id__in=blog_ids)
+    tag_sets = defaultdict(set)
+    for blog_id, tag_id in items.values_list('object_id', 'tag_id').iterator():
+        tag_sets[blog_id].add(tag_id)
+    return tag_sets
+
+
+def _neighbours(blog_id, tag_sets, posts_by_tag, limit):
+    """
+    Ranks the posts sharing tags with ``blog_id`` by Jaccard score.
+    """
+    tags = tag_sets.get(blog_id)
+    if not tags:
+        return []
+    shared = defaultdict(int)
+    for tag_id in tags:
+        for other_id in posts_by_tag[tag_id]:
+            if other_id != blog_id:
+                shared[other_id] += 1
+    scored = [
+        (count / (len(tags) + len(tag_sets[other_id]) - count), other_id)
+        for other_id, count in shared.items()
+    ]
+    # best score first, newer posts first on ties
+    scored.sort(key=lambda item: (-item[0], -item[1]))
+    return [
+        RelatedPost(blog_id=blog_id, related_id=other_id, score=score, rank=rank)
+        for rank, (score, other_id) in enumerate(scored[:limit])
+    ]
+
+
+def refresh_related_posts(blog_ids, limit=None):
+    """
+    Recomputes the related posts of the given blogs.
+
+    Args:
+        blog_ids (iterable): The primary keys of the blogs to refresh.
+        limit (int): How many neighbours to keep per blog.
+            Defaults to the ``BLOG_RELATED_POSTS`` setting.
+    """
+    if limit is None:
+        limit = settings.BLOG_RELATED_POSTS
+    blog_ids = set(blog_ids)
+    own_tags = _tag_sets(blog_ids)
+    tag_ids = set().union(*own_tags.values())
+    candidate_ids = set(
+        _tagged_items().filter(tag_id__in=tag_ids).values_list('object_id', flat=True)
+    )
+    tag_sets = _tag_sets(candidate_ids - blog_ids)
+    tag_sets.update(own_tags)
+    posts_by_tag = defaultdict(set)
+    for other_id, other_tags in tag_sets.items():
+        for tag_id in other_tags & tag_ids:
+            posts_by_tag[tag_id].add(other_id)
+
+    rows = []
+    for blog_id in blog_ids:
+        rows.extend(_neighbours(blog_id, tag_sets, posts_by_tag, limit))
+    with transaction.atomic():
+        RelatedPost.objects.filter(blog_id__in=blog_ids).delete()
+        RelatedPost.objects.bulk_create(rows)
+    invalidate_fragments(*blog_ids)
+
+
+def refresh_after_tag_change(blog_id, tag_ids):
+    """
+    Refreshes a post and queues the refresh of the posts sharing its tags.
+
+    Args:
+        blog_id (int): The primary key of the post whose tags changed
+            (it may not exist anymore).
+        tag_ids (iterable): The tags the post had before and after the change.
+    """
+    refresh_related_posts([blog_id])
+    tag_ids = sorted(set(tag_ids))
+    if tag_ids:
+        enqueue('blog.related.refresh_neighbours', blog_id=blog_id, tag_ids=tag_ids)
+
+
+def refresh_neighbours(blog_id, tag_ids, batch_size=500, exclude_ids=()):
+    """
+    Background job: refreshes the posts whose neighbours may have changed with a post.
+
+    Args:
+        blog_id (int): The post whose tags changed, already refreshed.
+        tag_ids (list): The tags it had before and after the change.
+        batch_size (int): Number of posts refreshed per transaction.
+        exclude_ids (list): Other posts already refreshed, e.g. the posts
+            of an import (``blog_id`` is then None).
+    """
+    affected = set(
+        _tagged_items().filter(tag_id__in=tag_ids).values_list('object_id', flat=True)
+    )
+    affected.discard(blog_id)
+    affected.difference_update(exclude_ids)
+    affected = sorted(affected)
+    for start in range(0, len(affected), batch_size):
+        refresh_related_posts(affected[start:start + batch_size])
+
+
+def rebuild_related_posts(batch_size=1000, limit=None):
+    """
+    Recomputes the related posts of every blog.
+
+    The tag sets are read once, the rows are written in batches.
+
+    Returns:
+        int: The number of related post rows written.
+    """
+    if limit is None:
+        limit = settings.BLOG_RELATED_POSTS
+    existing = set(Blog.objects.values_list('id', flat=True))
+    tag_sets = {
+        blog_id: tags for blog_id, tags in _tag_sets().items() if blog_id in existing
+    }
+    posts_by_tag = defaultdict(set)
+    for blog_id, tags in tag_sets.items():
+        for tag_id in tags:
+            posts_by_tag[tag_id].add(blog_id)
+
+    count = 0
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        rows = []
+        for blog_id in tag_sets:
+            rows.extend(_neighbours(blog_id, tag_sets, posts_by_tag, limit))
+            if len(rows) >= batch_size:
+                RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+                count += len(rows)
+                rows = []
+        RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+        count += len(rows)
+    # every sidebar listing related posts is keyed on the site-wide version
+    invalidate_fragments()
+    return count
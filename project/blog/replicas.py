@@ -0,0 +1,122 @@
+"""
+Read replicas for the read-only blog views.
+
+Views decorated with ``read_replica`` run their blog and tag queries on one of
+the ``REPLICA_DATABASES`` aliases, picked round robin per request. Writes
+always go to ``default``. After a write view (``writes_to_primary``) posted
+or wrote, whatever the method (the delete links are GETs), the browser gets
+a short-lived cookie making its next reads use ``default`` too, so users see
+their own comment or post even when the replicas lag behind.
+
+Sessions, users and everything outside ``REPLICA_APPS`` keep reading from
+``default``: a lagging replica must not log anybody out.
+"""
+import itertools
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_COOKIE = 'read_primary'
+REPLICA_APPS = {'blog', 'taggit'}
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+_read_db = ContextVar('read_db', default=None)
+_counter = itertools.count()
+
+
+def next_replica():
+    """
+    Returns the next replica alias, round robin, or None when there is none.
+    """
+    replicas = settings.REPLICA_DATABASES
+    if not replicas:
+        return None
+    return replicas[next(_counter) % len(replicas)]
+
+
+def reading_replica():
+    """
+    Returns whether the current request reads from a replica.
+    """
+    return _read_db.get() is not None
+
+
+class ReplicaRouter:
+    """
+    Routes the reads of ``read_replica`` views to the replica of the request.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            return _read_db.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as default
+        databases = {'default', *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def read_replica(view):
+    """
+    Decorates a read-only view, sync or async, so its queries run on a replica.
+    """
+    def replica_for(request):
+        return None if request.COOKIES.get(PRIMARY_COOKIE) else next_replica()
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # the context variable follows the ORM calls into their threads
+            token = _read_db.set(replica_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_db.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_db.set(replica_for(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_db.reset(token)
+    return wrapper
+
+
+def writes_to_primary(view):
+    """
+    Decorates a write view so the next reads of the browser use ``default``.
+
+    The cookie is set after a POST, and after any request that wrote to
+    ``default``.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.REPLICA_DATABASES:
+            return view(request, *args, **kwargs)
+        wrote = []
+
+        def detect_write(execute, sql, params, many, context):
+            if sql.lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS:
+                wrote.append(True)
+            return execute(sql, params, many, context)
+
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(detect_write):
+            response = view(request, *args, **kwargs)
+        if request.method == 'POST' or wrote:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=settings.READ_YOUR_WRITES_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+    return wrapper
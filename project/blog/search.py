@@ -0,0 +1,303 @@
+"""
+Full-text search for blog posts.
+
+The home page search goes through one of three backends, picked from the
+``BLOG_SEARCH_BACKEND`` setting (``auto`` by default):
+
+* ``sqlite_fts`` - an FTS5 virtual table (``blog_blog_fts``) keyed by blog id.
+* ``postgres`` - a generated ``tsvector`` column on ``blog_blog`` with a GIN index.
+* ``python`` - an inverted index stored in the ``SearchTerm`` table, used when
+  neither of the above is available.
+
+Every backend returns blog ids ranked by relevance, and every query term is
+matched as a prefix so partial words typed in the search box still hit.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Sum, Value, When
+
+from .models import Blog, SearchTerm
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Weight of a title hit relative to a content hit.
+TITLE_WEIGHT = 10
+CONTENT_WEIGHT = 1
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The tokens, in order of appearance.
+    """
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class SearchBackend:
+    """
+    Base class of the search backends.
+    """
+    name = None
+
+    def index(self, blog):
+        """Adds or refreshes the index entry of a blog post."""
+        raise NotImplementedError
+
+    def remove(self, blog_id):
+        """Drops the index entry of a blog post."""
+        raise NotImplementedError
+
+    def search(self, query, limit):
+        """Returns the ids of the blog posts matching ``query``, best first."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=500):
+        """Reindexes every blog post and returns how many were indexed."""
+        return self.reindex(None, batch_size)
+
+    def reindex(self, blog_ids, batch_size=500):
+        """Indexes the given blog posts (all of them with None) and returns how many were indexed."""
+        count = 0
+        blogs = Blog.objects.only('id', 'title', 'content').order_by('id')
+        if blog_ids is not None:
+            blogs = blogs.filter(id__in=blog_ids)
+        for blog in blogs.iterator(chunk_size=batch_size):
+            self.index(blog)
+            count += 1
+        return count
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Searches the ``blog_blog_fts`` FTS5 table, ranked with bm25.
+    """
+    name = 'sqlite_fts'
+    table = 'blog_blog_fts'
+
+    def index(self, blog):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {self.table}(rowid, title, content) VALUES (%s, %s, %s)',
+                [blog.id, blog.title, blog.content],
+            )
+
+    def remove(self, blog_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [blog_id])
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, %s, %s) LIMIT %s',
+                [match, float(TITLE_WEIGHT), float(CONTENT_WEIGHT), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=500):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table}')
+            return super().rebuild(batch_size)
+
+
+class PostgresBackend(SearchBackend):
+    """
+    Searches the generated ``blog_blog.search_vector`` column.
+
+    The column is computed by PostgreSQL itself on every write, so indexing and
+    removal are no-ops here.
+    """
+    name = 'postgres'
+
+    def index(self, blog):
+        pass
+
+    def remove(self, blog_id):
+        pass
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM blog_blog WHERE search_vector @@ to_tsquery('english', %s) "
+                "ORDER BY ts_rank(search_vector, to_tsquery('english', %s)) DESC, id DESC LIMIT %s",
+                [tsquery, tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=500):
+        with connection.cursor() as cursor:
+            cursor.execute('REINDEX INDEX blog_blog_search_vector_idx')
+        return Blog.objects.count()
+
+    def reindex(self, blog_ids, batch_size=500):
+        if blog_ids is None:
+            return self.rebuild(batch_size)
+        return Blog.objects.filter(id__in=blog_ids).count()
+
+
+class PythonBackend(SearchBackend):
+    """
+    Inverted index kept in the ``SearchTerm`` table.
+
+    Each row holds one term of one post with its weighted frequency. Prefix
+    matching is a range scan on the indexed ``term`` column.
+    """
+    name = 'python'
+
+    def terms_for(self, blog):
+        weights = {}
+        for token in tokenize(blog.title):
+            weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(blog.content):
+            weights[token] = weights.get(token, 0) + CONTENT_WEIGHT
+        max_length = SearchTerm._meta.get_field('term').max_length
+        return [
+            SearchTerm(blog_id=blog.id, term=term, weight=weight)
+            for term, weight in weights.items()
+            if len(term) <= max_length
+        ]
+
+    def index(self, blog):
+        with transaction.atomic():
+            SearchTerm.objects.filter(blog_id=blog.id).delete()
+            SearchTerm.objects.bulk_create(self.terms_for(blog))
+
+    def remove(self, blog_id):
+        SearchTerm.objects.filter(blog_id=blog_id).delete()
+
+    def search(self, query, limit):
+        scores = None
+        for token in set(tokenize(query)):
+            matches = (
+                SearchTerm.objects
+                .filter(term__gte=token, term__lt=token + '\uffff')
+                .values('blog_id')
+                .annotate(score=Sum('weight'))
+            )
+            token_scores = {row['blog_id']: row['score'] for row in matches}
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    blog_id: score + token_scores[blog_id]
+                    for blog_id, score in scores.items()
+                    if blog_id in token_scores
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [blog_id for blog_id, score in ranked[:limit]]
+
+    def reindex(self, blog_ids, batch_size=500):
+        count = 0
+        with transaction.atomic():
+            blogs = Blog.objects.only('id', 'title', 'content').order_by('id')
+            if blog_ids is None:
+                SearchTerm.objects.all().delete()
+            else:
+                SearchTerm.objects.filter(blog_id__in=blog_ids).delete()
+                blogs = blogs.filter(id__in=blog_ids)
+            terms = []
+            for blog in blogs.iterator(chunk_size=batch_size):
+                terms.extend(self.terms_for(blog))
+                count += 1
+                if len(terms) >= batch_size:
+                    SearchTerm.objects.bulk_create(terms, batch_size=batch_size)
+                    terms = []
+            SearchTerm.objects.bulk_create(terms, batch_size=batch_size)
+        return count
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (SQLiteFTSBackend, PostgresBackend, PythonBackend)
+}
+
+_backend = None
+
+
+def get_backend():
+    """
+    Returns the search backend configured for the default database.
+
+    With ``BLOG_SEARCH_BACKEND = 'auto'`` PostgreSQL uses its tsvector column,
+    SQLite uses FTS5 when the virtual table exists, and anything else falls
+    back to the pure-Python index.
+
+    Returns:
+        SearchBackend: The backend instance.
+    """
+    global _backend
+    if _backend is None:
+        name = getattr(settings, 'BLOG_SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            if connection.vendor == 'postgresql':
+                name = PostgresBackend.name
+            elif (connection.vendor == 'sqlite'
+                    and SQLiteFTSBackend.table in connection.introspection.table_names()):
+                name = SQLiteFTSBackend.name
+            else:
+                name = PythonBackend.name
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+def search_blogs(query, limit=None):
+    """
+    Searches the blog posts.
+
+    Args:
+        query (str): The text typed by the user.
+        limit (int): The maximum number of ids to return.
+            Defaults to the ``BLOG_SEARCH_MAX_RESULTS`` setting.
+
+    Returns:
+        list: The matching blog ids, most relevant first.
+    """
+    if limit is None:
+        limit = getattr(settings, 'BLOG_SEARCH_MAX_RESULTS', 200)
+    return get_backend().search(query, limit)
+
+
+def ranked_blogs(query, queryset=None):
+    """
+    Filters a blog queryset down to the search results, in rank order.
+
+    The position of each post in the results is annotated as ``search_rank``
+    (0 is the best match), so the results can be paginated on it.
+
+    Args:
+        query (str): The text typed by the user.
+        queryset (QuerySet): The blog queryset to filter. Defaults to all posts.
+
+    Returns:
+        QuerySet: The matching posts, most relevant first.
+    """
+    if queryset is None:
+        queryset = Blog.objects.all()
+    blog_ids = search_blogs(query)
+    if not blog_ids:
+        return queryset.annotate(search_rank=Value(0)).none()
+    rank = Case(
+        *[When(id=blog_id, then=position) for position, blog_id in enumerate(blog_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=blog_ids).annotate(search_rank=rank).order_by('search_rank')
@@ -0,0 +1,93 @@
+"""
+Serializers of the read API (see api.py).
+
+Every serializer accepts a ``fields`` argument, the sparse fieldset asked for
+with ``?fields=id,title``, and builds the queryset it needs for those fields
+in ``setup_queryset``: the joins, prefetches and large columns of the fields
+left out are never read.
+"""
+from rest_framework import serializers
+
+from .models import Blog, Comment, Tag
+
+
+class SparseFieldsMixin:
+    """
+    Drops the fields that were not asked for.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """
+        Reads the ``fields`` query parameter.
+
+        Returns:
+            list: The field names, or None when every field is wanted.
+
+        Raises:
+            ValidationError: When a name is not a field of the serializer.
+        """
+        raw = request.query_params.get('fields')
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(cls.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None):
+        return queryset
+
+
+class BlogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.CharField(source='author.username', read_only=True)
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='slug')
+
+    class Meta:
+        model = Blog
+        fields = [
+            'id', 'title', 'excerpt', 'content', 'word_count', 'reading_time', 'image',
+            'date', 'updated_at', 'author', 'tags', 'comment_count',
+        ]
+
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None):
+        fields = set(cls.Meta.fields if fields is None else fields)
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'content' not in fields:
+            queryset = queryset.defer('content')
+        return queryset
+
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # the user of a comment is set to NULL when the account is deleted
+    user = serializers.CharField(source='user.username', read_only=True, allow_null=True)
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'blog', 'user', 'comment', 'created_at']
+
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None):
+        fields = set(cls.Meta.fields if fields is None else fields)
+        if 'user' in fields:
+            queryset = queryset.select_related('user')
+        return queryset
+
+
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'slug']
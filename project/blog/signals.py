@@ -0,0 +1,89 @@
+from django.db.models.signals import post_save, post_delete
+from django.core.cache import cache
+from .models import Blog, Comment, ContactInfo, Tag
+from .counters import adjust_comment_count, recount_comments
+from .fragments import invalidate_fragments
+from .tagstats import TAG_CLOUD_KEY
+from . import search
+
+
+# Keeping the search index in sync with the posts
+def index_blog(sender, instance, **kwargs):
+    search.get_backend().index(instance)
+
+
+def unindex_blog(sender, instance, **kwargs):
+    search.get_backend().remove(instance.id)
+
+
+post_save.connect(index_blog, sender=Blog)
+post_delete.connect(unindex_blog, sender=Blog)
+
+
+# Keeping Blog.comment_count equal to the number of active comments
+def count_comment(sender, instance, created, **kwargs):
+    current = (instance.blog_id, instance.active)
+    previous = getattr(instance, '_counted', None)
+    if created:
+        # nothing was counted yet, a single F() increment
+        adjust_comment_count(instance.blog_id, int(instance.active))
+    elif previous is None or None in previous:
+        # the stored state is unknown, so count from the table
+        recount_comments([instance.blog_id])
+    elif previous != current:
+        adjust_comment_count(previous[0], -int(previous[1]))
+        adjust_comment_count(current[0], int(current[1]))
+    instance._counted = current
+
+
+def _deleting_blog(origin):
+    # the comments deleted along with their post
+    return isinstance(origin, Blog) or getattr(origin, 'model', None) is Blog
+
+
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    if _deleting_blog(origin):
+        return
+    blog_id, active = getattr(instance, '_counted', (instance.blog_id, instance.active))
+    if active is None:
+        recount_comments([blog_id])
+    elif active:
+        adjust_comment_count(blog_id, -1)
+
+
+post_save.connect(count_comment, sender=Comment)
+post_delete.connect(uncount_comment, sender=Comment)
+
+
+# Dropping the cached template fragments of the changed posts
+def invalidate_blog_fragments(sender, instance, **kwargs):
+    invalidate_fragments(instance.id)
+
+
+def invalidate_comment_fragments(sender, instance, origin=None, **kwargs):
+    if not _deleting_blog(origin):
+        invalidate_fragments(instance.blog_id)
+
+
+post_save.connect(invalidate_blog_fragments, sender=Blog)
+post_delete.connect(invalidate_blog_fragments, sender=Blog)
+post_save.connect(invalidate_comment_fragments, sender=Comment)
+post_delete.connect(invalidate_comment_fragments, sender=Comment)
+
+
+# Dropping the cached contact info when it is edited in the admin
+def invalidate_contact_info(sender, **kwargs):
+    ContactInfo.invalidate()
+
+
+post_save.connect(invalidate_contact_info, sender=ContactInfo)
+post_delete.connect(invalidate_contact_info, sender=ContactInfo)
+
+
+# Dropping the cached tag cloud when a tag is renamed or deleted in the admin
+def invalidate_tag_cloud(sender, **kwargs):
+    cache.delete(TAG_CLOUD_KEY)
+
+
+post_save.connect(invalidate_tag_cloud, sender=Tag)
+post_delete.connect(invalidate_tag_cloud, sender=Tag)
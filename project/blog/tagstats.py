@@ -0,0 +1,98 @@
+"""
+Materialized tag statistics.
+
+The ``TagStat`` table holds the number of posts and the date of the latest
+post of every tag in use. The views that change the tags of a post refresh
+the rows of those tags, so the tag listing and the tag cloud are plain
+indexed reads and never aggregate the taggit through table at request time.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Blog, TagStat
+
+TAG_CLOUD_KEY = 'blog:tag-cloud'
+
+
+def _aggregate(tag_ids=None):
+    blogs = Blog.objects.all()
+    if tag_ids is not None:
+        blogs = blogs.filter(tags__id__in=tag_ids)
+    else:
+        blogs = blogs.filter(tags__isnull=False)
+    rows = blogs.values('tags__id').annotate(post_count=Count('id'), latest_post_date=Max('date')).order_by()
+    return [
+        TagStat(tag_id=row['tags__id'], post_count=row['post_count'], latest_post_date=row['latest_post_date'])
+        for row in rows
+    ]
+
+
+def _store(stats, stale):
+    with transaction.atomic():
+        stale.delete()
+        TagStat.objects.bulk_create(
+            stats, update_conflicts=True, unique_fields=['tag'],
+            update_fields=['post_count', 'latest_post_date'],
+        )
+    cache.delete(TAG_CLOUD_KEY)
+
+
+def refresh_tag_stats(tag_ids):
+    """
+    Recomputes the statistics of the given tags with one grouped query.
+
+    Tags left without posts lose their row.
+
+    Args:
+        tag_ids (iterable): The tags a post had before and after a change.
+    """
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    stats = _aggregate(tag_ids)
+    used = {stat.tag_id for stat in stats}
+    _store(stats, TagStat.objects.filter(tag_id__in=tag_ids - used))
+
+
+def rebuild_tag_stats():
+    """
+    Recomputes the statistics of every tag.
+
+    Returns:
+        int: The number of tags in use.
+    """
+    stats = _aggregate()
+    _store(stats, TagStat.objects.exclude(tag_id__in=[stat.tag_id for stat in stats]))
+    return len(stats)
+
+
+def tag_cloud():
+    """
+    Returns the ``BLOG_TAG_CLOUD_SIZE`` most used tags, by name, with a weight from 1 to 5.
+
+    The list is cached until the statistics change, so it is read from
+    ``default``: a lagging replica would cache the old counts for good.
+    """
+    cloud = cache.get(TAG_CLOUD_KEY)
+    if cloud is None:
+        stats = list(
+            TagStat.objects.using('default').select_related('tag')
+            .order_by('-post_count', '-tag')[:settings.BLOG_TAG_CLOUD_SIZE]
+        )
+        most = max((stat.post_count for stat in stats), default=1)
+        cloud = [
+            {
+                'name': stat.tag.name,
+                'slug': stat.tag.slug,
+                'post_count': stat.post_count,
+                # log scale, a tag on every post does not dwarf the others
+                'weight': 1 + round(4 * math.log(stat.post_count) / math.log(most)) if most > 1 else 1,
+            }
+            for stat in sorted(stats, key=lambda stat: stat.tag.name.lower())
+        ]
+        cache.set(TAG_CLOUD_KEY, cloud, timeout=None)
+    return cloud
@@ -0,0 +1,61 @@
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from blog.fragments import fragment_version as get_fragment_version
+from blog.images import get_renditions, rendition_state as get_rendition_state, srcset
+
+register = template.Library()
+
+
+@register.filter
+def fragment_version(blog):
+    """
+    Returns the fragment cache version of a post, for ``{% cache %}`` keys.
+
+    Usage: ``{% cache timeout name blog.id blog|fragment_version %}``
+    ``"all"|fragment_version`` is the site-wide version.
+    """
+    return get_fragment_version(getattr(blog, 'id', blog))
+
+
+@register.filter
+def rendition_state(image):
+    """
+    Returns whether the renditions of an image are ready, for ``{% cache %}`` keys.
+    """
+    return get_rendition_state(image.name) if image else ''
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', **attrs):
+    """
+    Renders an uploaded image with ``srcset`` pointing at its renditions.
+
+    Usage: ``{% responsive_image blog.image sizes="50vw" class="img-fluid" alt="Image" %}``
+    Images without renditions are rendered as a plain ``<img>`` of the original,
+    images still waiting for the worker as a placeholder.
+    """
+    if not image:
+        return ''
+    attrs.setdefault('alt', '')
+    manifest = get_renditions(image.name)
+    if manifest is None:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+    if manifest.get('pending'):
+        return format_html('<img src="{}"{}>', static('img/placeholder.svg'), flatatt(attrs))
+
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}">',
+        (
+            (image_format, srcset(image.name, manifest, image_format), sizes)
+            for image_format in manifest['formats'] if image_format != 'jpeg'
+        ),
+    )
+    if 'jpeg' in manifest['formats']:
+        attrs['srcset'] = srcset(image.name, manifest, 'jpeg')
+        attrs['sizes'] = sizes
+    return format_html(
+        '<picture>{}<img src="{}"{}></picture>', sources, image.url, flatatt(attrs)
+    )
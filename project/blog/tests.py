@@ -1,3 +1,1030 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts.backends import CachedModelBackend
+
+from . import search
+from .benchmark import generate_data, regressions, run_scenario, scenarios
+from .context_processors import fragment_cache
+from .images import generate_renditions, get_renditions, manifest_name, queue_image_processing, rendition_name
+from .instrumentation import buffer, percentile, url_percentiles
+from .jobs import enqueue, run_pending
+from .moderation import moderate
+from .models import Blog, Comment, ContactInfo, Job, RelatedPost, RequestSample, TagStat
+from .pagination import CursorPaginator
+from .related import rebuild_related_posts, refresh_related_posts
+from .replicas import PRIMARY_COOKIE, ReplicaRouter, read_replica
+from .search import ranked_blogs, search_blogs
+from .tagstats import rebuild_tag_stats, refresh_tag_stats, tag_cloud
+
+class QueryCountMixin:
+    """
+    Pins the number of queries a view runs, so N+1 regressions fail the suite.
+    """
+
+    def assertViewQueries(self, expected, url_name, *args, data=None):
+        url = reverse(url_name, args=args)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+class BlogTestData:
+    """
+    Creates a few users, tagged posts and comments shared by the test cases.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret-pass-123')
+        cls.commenters = [
+            User.objects.create_user(username=f'commenter{i}', password='secret-pass-123')
+            for i in range(3)
+        ]
+        cls.blogs = []
+        for i in range(4):
+            blog = Blog.objects.create(
+                author=cls.user,
+                title=f'post number {i}',
+                content=f'content of post {i}',
+                image='blog-images/test.png',
+            )
+            blog.tags.add('django', f'tag{i}')
+            cls.blogs.append(blog)
+        for commenter in cls.commenters:
+            for blog in cls.blogs:
+                Comment.objects.create(comment='nice post', blog=blog, user=commenter, active=True)
+        rebuild_tag_stats()
+
+    def login(self):
+        self.client.force_login(self.user)
+        # like after the first request, request.user comes from the cache
+        CachedModelBackend().get_user(self.user.pk)
+
+
+# the buffered request samples must not be flushed inside the pinned counts,
+# and the session is read from the cache whatever SESSION_MODE says
+PINNED_QUERIES = dict(
+    REQUEST_METRICS_SAMPLE_RATE=0, SESSION_ENGINE='django.contrib.sessions.backends.cached_db'
+)
+
+
+@override_settings(**PINNED_QUERIES)
+class ViewQueryCountTests(QueryCountMixin, BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # base.html shows the contact info, read once per process, and the
+        # tag cloud, cached until the tag statistics change
+        ContactInfo.load()
+        tag_cloud()
+        self.login()
+
+    def test_post_queries(self):
+        # 2 conditional GET validators, post, tags,
+        # comments with users and profiles, related posts
+        response = self.assertViewQueries(6, 'post', self.blogs[0].id)
+        self.assertEqual(len(response.context['comments']), len(self.commenters))
+
+    def test_post_queries_do_not_grow_with_comments(self):
+        for i in range(5):
+            commenter = User.objects.create_user(username=f'extra{i}', password='secret-pass-123')
+            Comment.objects.create(comment='me too', blog=self.blogs[0], user=commenter, active=True)
+        self.assertViewQueries(6, 'post', self.blogs[0].id)
+
+    def test_cached_post_skips_related_posts(self):
+        self.client.get(reverse('post', args=[self.blogs[0].id]))
+        self.assertViewQueries(5, 'post', self.blogs[0].id)
+
+    def test_home_queries(self):
+        # 2 conditional GET validators, page of posts with authors
+        self.assertViewQueries(3, 'home')
+
+    def test_home_search_queries(self):
+        # plus the search index lookup
+        self.assertViewQueries(4, 'home', data={'search': 'post'})
+
+    def test_get_tags_queries(self):
+        # plus the tag lookup
+        self.assertViewQueries(4, 'tags', 'django')
+
+
+class SearchBackendTests:
+    """
+    Checks a search backend, through the signals and ``rebuild_search_index``.
+    """
+    backend_class = None
+
+    def setUp(self):
+        patcher = mock.patch.object(search, '_backend', self.backend_class())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user(username='writer', password='secret-pass-123')
+        self.title_hit = Blog.objects.create(author=user, title='Django caching', content='Some notes.')
+        self.content_hit = Blog.objects.create(
+            author=user, title='Notes', content='Caching with Django, more about django.'
+        )
+        self.other = Blog.objects.create(author=user, title='Gardening', content='Growing tomatoes.')
+
+    def test_title_hits_rank_first(self):
+        self.assertEqual(search_blogs('django'), [self.title_hit.id, self.content_hit.id])
+        self.assertEqual(
+            list(ranked_blogs('django').values_list('id', flat=True)), [self.title_hit.id, self.content_hit.id]
+        )
+
+    def test_terms_match_as_prefixes_and_all_must_match(self):
+        self.assertEqual(set(search_blogs('cach')), {self.title_hit.id, self.content_hit.id})
+        self.assertEqual(search_blogs('TOMAT'), [self.other.id])
+        self.assertEqual(set(search_blogs('django notes')), {self.title_hit.id, self.content_hit.id})
+        self.assertEqual(search_blogs('django tomatoes'), [])
+
+    def test_empty_and_odd_queries_find_nothing(self):
+        for query in ['', '   ', '!!!', '"', '*', 'AND', 'NEAR(', 'missing']:
+            self.assertEqual(search_blogs(query), [], query)
+        self.assertFalse(ranked_blogs('').exists())
+
+    def test_index_follows_the_posts(self):
+        self.other.title = 'Orchards'
+        self.other.save()
+        self.assertEqual(search_blogs('orchard'), [self.other.id])
+        self.assertEqual(search_blogs('gardening'), [])
+        self.other.delete()
+        self.assertEqual(search_blogs('orchard'), [])
+        created = Blog.objects.create(author=self.other.author, title='Orchards again', content='')
+        self.assertEqual(search_blogs('orchard'), [created.id])
+
+    def test_rebuild_command(self):
+        for blog in Blog.objects.all():
+            search.get_backend().remove(blog.id)
+        self.assertEqual(search_blogs('django'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn(f'Indexed 3 posts with the {self.backend_class.name} backend', out.getvalue())
+        self.assertEqual(search_blogs('django'), [self.title_hit.id, self.content_hit.id])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 is only available on SQLite')
+class SQLiteFTSSearchTests(SearchBackendTests, TestCase):
+    backend_class = search.SQLiteFTSBackend
+
+
+class PythonSearchTests(SearchBackendTests, TestCase):
+    backend_class = search.PythonBackend
+
+
+class CursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='writer', password='secret-pass-123')
+        for i in range(7):
+            Blog.objects.create(author=user, title=f'post {i}', content='')
+        # ties on the date, the id breaks them
+        tied = Blog.objects.order_by('id').values_list('id', flat=True)[1:5]
+        Blog.objects.filter(id__in=list(tied)).update(date=timezone.now())
+        cls.expected = list(Blog.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def paginator(self, queryset=None):
+        return CursorPaginator(Blog.objects.all() if queryset is None else queryset, 3)
+
+    def ids(self, page):
+        return [blog.id for blog in page]
+
+    def test_forward_then_backward(self):
+        paginator = self.paginator()
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([blog_id for page in pages for blog_id in self.ids(page)], self.expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertFalse(pages[-1].has_next())
+
+        previous = paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual(self.ids(previous), self.ids(pages[1]))
+        first = paginator.get_page(previous.previous_cursor)
+        self.assertEqual(self.ids(first), self.ids(pages[0]))
+        self.assertFalse(first.has_previous())
+        self.assertEqual(first.next_cursor, pages[0].next_cursor)
+
+    def test_exact_and_empty_pages(self):
+        paginator = self.paginator(Blog.objects.filter(id__in=self.expected[:6]))
+        second = paginator.get_page(paginator.get_page().next_cursor)
+        self.assertEqual(self.ids(second), self.expected[3:6])
+        self.assertFalse(second.has_next())
+        empty = self.paginator(Blog.objects.none()).get_page()
+        self.assertEqual((len(empty), empty.has_other_pages()), (0, False))
+
+    def test_invalid_cursors_return_the_first_page(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        paginator = self.paginator()
+        for cursor in [
+            'garbage', '%%%', token([1, 2]), token({'v': [1]}), token({'v': ['not a date', 1]}),
+            token({'v': [None, 'x']}), token({'v': [None, 1]}), token({}),
+        ]:
+            self.assertEqual(self.ids(paginator.get_page(cursor)), self.expected[:3], cursor)
+
+    def test_invalid_cursors_of_the_search_feed(self):
+        user = User.objects.get(username='writer')
+        self.client.force_login(user)
+        for values in [['abc'], [[1]], [{'a': 1}], [None], ['1.5']]:
+            cursor = base64.urlsafe_b64encode(json.dumps({'v': values, 'b': 0}).encode()).decode()
+            response = self.client.get(reverse('home'), {'search': 'post', 'cursor': cursor})
+            self.assertEqual(response.status_code, 200, values)
+            self.assertFalse(response.context['blogs'].has_previous(), values)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the plans are checked on SQLite')
+class QueryPlanTests(BlogTestData, TestCase):
+    """
+    Checks with EXPLAIN that the hot view queries read the blog tables through an index.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertUsesIndexes(self, url, *index_names):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in captured:
+                if '"blog_' in query['sql']:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.extend(row[3] for row in cursor.fetchall())
+        plans = '\n'.join(plans)
+        # a full scan of a blog table, not through an index
+        self.assertNotRegex(plans, r'(?m)^SCAN blog_\w+$')
+        for name in index_names:
+            self.assertIn(name, plans)
+
+    def test_home(self):
+        self.assertUsesIndexes(
+            reverse('home'),
+            'blog_blog_date_id', 'blog_blog_updated_at', 'blog_comment_active_created_at',
+        )
+
+    def test_home_next_page(self):
+        cursor = self.client.get(reverse('home')).context['blogs'].next_cursor
+        self.assertUsesIndexes(reverse('home') + f'?cursor={cursor}', 'blog_blog_date_id (date<?)')
+
+    def test_post(self):
+        self.assertUsesIndexes(reverse('post', args=[self.blogs[0].id]), 'blog_comment_active_blog_id')
+
+    def test_last_post(self):
+        self.assertUsesIndexes(reverse('last_post'), 'blog_blog_date_id')
+
+
+class ContactInfoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ContactInfo.invalidate()
+        self.addCleanup(ContactInfo.invalidate)
+
+    def create_info(self, **fields):
+        return ContactInfo.objects.create(**{
+            'address': 'somewhere', 'tel': '0600', 'email': 'us@example.com',
+            'facebook': 'https://fb.com/blog', 'twitter': 'https://x.com/blog',
+            'instagram': 'https://instagram.com/blog', 'youtube': 'https://youtube.com/blog',
+            **fields,
+        })
+
+    def test_missing_info_is_cached(self):
+        self.assertIsNone(ContactInfo.load())
+        with self.assertNumQueries(0):
+            self.assertIsNone(ContactInfo.load())
+
+    def test_save_refreshes_the_cached_info(self):
+        self.assertIsNone(ContactInfo.load())
+        info = self.create_info()
+        self.assertEqual(info.pk, ContactInfo.SINGLETON_PK)
+        self.assertEqual(ContactInfo.load().tel, '0600')
+        # a process that did not see the save still reads the shared cache
+        ContactInfo._local = None
+        with self.assertNumQueries(0):
+            self.assertEqual(ContactInfo.load().tel, '0600')
+        info.tel = '0700'
+        info.save()
+        self.assertEqual(ContactInfo.load().tel, '0700')
+        self.assertEqual(ContactInfo.objects.count(), 1)
+
+    def test_base_template_shows_the_links(self):
+        user = User.objects.create_user(username='reader', password='secret-pass-123')
+        self.client.force_login(user)
+        self.create_info()
+        self.assertContains(self.client.get(reverse('contact')), 'https://fb.com/blog', count=2)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class SQLiteConnectionTests(TestCase):
+
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(REPLICA_DATABASES=['replica_a', 'replica_b'])
+class ReplicaRoutingTests(BlogTestData, TestCase):
+
+    def read_databases(self, cookies=None):
+        router = ReplicaRouter()
+
+        @read_replica
+        def view(request):
+            return HttpResponse(f'{router.db_for_read(Blog)} {router.db_for_read(User)}')
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return view(request).content.decode()
+
+    def test_reads_alternate_between_replicas(self):
+        seen = {self.read_databases() for _ in range(4)}
+        # sessions and users stay on default
+        self.assertEqual(seen, {'replica_a None', 'replica_b None'})
+        self.assertEqual(ReplicaRouter().db_for_read(Blog), None)
+        self.assertEqual(ReplicaRouter().db_for_write(Blog), 'default')
+
+    def test_shared_caches_are_filled_from_default(self):
+        # nothing reads the (fake) replicas here, or it would fail to connect
+        cache.clear()
+        ContactInfo.invalidate()
+
+        @read_replica
+        def view(request):
+            ContactInfo.load()
+            tag_cloud()
+            return HttpResponse(fragment_cache(request)['FRAGMENT_CACHE_TIMEOUT'])
+
+        self.assertEqual(view(RequestFactory().get('/')).content, b'30')
+        self.assertEqual(fragment_cache(None)['FRAGMENT_CACHE_TIMEOUT'], 3600)
+
+    def test_writes_stick_the_browser_to_default(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('add_comment'), {'blog': self.blogs[0].id, 'content': 'hi'})
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]['max-age'], 10)
+        self.assertEqual(self.read_databases({PRIMARY_COOKIE: '1'}), 'None None')
+
+    def test_deletes_by_link_stick_the_browser_to_default(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('delete_blog', args=[self.blogs[0].id]))
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]['max-age'], 10)
+
+    def test_pages_without_writes_leave_the_replicas(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('edit_blog', args=[self.blogs[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+
+@override_settings(ROOT_URLCONF='blog.async_urls')
+class AsyncViewTests(BlogTestData, TestCase):
+    async_client_class = AsyncClient
+
+    def setUp(self):
+        cache.clear()
+        self.async_client.force_login(self.user)
+
+    def test_pages_match_the_sync_views(self):
+        self.client.force_login(self.user)
+        for url in [
+            reverse('home'), reverse('home') + '?search=post', reverse('post', args=[self.blogs[0].id]),
+            reverse('tags', args=['django']), reverse('last_post'),
+        ]:
+            response = async_to_sync(self.async_client.get)(url)
+            self.assertEqual(response.status_code, 200, url)
+            with self.settings(ROOT_URLCONF='project.urls'):
+                expected = self.client.get(url)
+            if 'blogs' in expected.context:
+                self.assertEqual(list(response.context['blogs']), list(expected.context['blogs']), url)
+            else:
+                self.assertEqual(response.context['post'], expected.context['post'], url)
+
+    async def test_post_page(self):
+        response = await self.async_client.get(reverse('post', args=[self.blogs[0].id]))
+        self.assertEqual(len(response.context['comments']), len(self.commenters))
+        self.assertContains(response, 'Post Number 0')
+        etag = response['ETag']
+        response = await self.async_client.get(
+            reverse('post', args=[self.blogs[0].id]), headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_feeds_do_not_read_the_content(self):
+        for data in [{}, {'search': 'post'}]:
+            response = await self.async_client.get(reverse('home'), data)
+            self.assertTrue(response.context['blogs'], data)
+            for blog in response.context['blogs']:
+                self.assertIn('content', blog.get_deferred_fields(), data)
+
+    async def test_missing_post_and_anonymous_user(self):
+        response = await self.async_client.get(reverse('post', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse('home'))
+        self.assertRedirects(response, reverse('login') + '?next=/', fetch_redirect_response=False)
+
+
+class CommentCountTests(BlogTestData, TestCase):
+
+    def assertCounted(self, blog, expected):
+        blog.refresh_from_db()
+        self.assertEqual(blog.comment_count, expected)
+        self.assertEqual(blog.comment_set.filter(active=True).count(), expected)
+
+    def test_new_comments_increment_the_counter(self):
+        blog = self.blogs[0]
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(comment='hi', blog=blog, user=self.user, active=True)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('COUNT', updates[0])
+        self.assertCounted(blog, 4)
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(comment='hidden', blog=blog, user=self.user)
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertCounted(blog, 4)
+
+    def test_approved_rejected_and_deleted_comments(self):
+        blog = self.blogs[0]
+        comment = Comment.objects.create(comment='hi', blog=blog, user=self.user)
+        comment.active = True
+        comment.save()
+        self.assertCounted(blog, 4)
+        moderate(Comment.objects.filter(pk=comment.pk), approve=False)
+        self.assertCounted(blog, 3)
+        Comment.objects.filter(blog=blog).first().delete()
+        self.assertCounted(blog, 2)
+
+    def test_deleting_a_post_does_not_uncount_its_comments(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.blogs[0].delete()
+        self.assertFalse([query for query in queries if 'comment_count' in query['sql']])
+
+    def test_reconcile_command(self):
+        Blog.objects.update(comment_count=0)
+        Comment.objects.filter(blog=self.blogs[1]).update(active=False)
+        out = StringIO()
+        call_command('reconcile_comment_counts', batch_size=3, stdout=out)
+        self.assertIn('Recounted comments of 4 blogs', out.getvalue())
+        self.assertEqual(
+            list(Blog.objects.order_by('id').values_list('comment_count', flat=True)), [3, 0, 3, 3]
+        )
+
+
+class RelatedPostTests(BlogTestData, TestCase):
+
+    def test_neighbours_are_ranked_by_tag_overlap(self):
+        first, second, third, fourth = self.blogs
+        second.tags.add('tag0')
+        third.tags.add('tag0', 'tag1', 'other')
+        refresh_related_posts([first.id])
+        related = list(
+            RelatedPost.objects.filter(blog=first).values_list('related_id', flat=True)
+        )
+        # second shares 2 of 3 tags, third 2 of 5, fourth 1 of 3
+        self.assertEqual(related, [second.id, third.id, fourth.id])
+
+    def test_tag_change_refreshes_the_post_and_queues_its_neighbours(self):
+        rebuild_related_posts()
+        first, second = self.blogs[:2]
+        self.client.force_login(self.user)
+        self.client.post(reverse('edit_blog', args=[first.id]), {
+            'title': first.title, 'content': first.content, 'tags': 'django, tag0, tag1',
+        })
+        # the edited post right away, with second sharing 2 tags now
+        self.assertEqual(RelatedPost.objects.filter(blog=first).first().related_id, second.id)
+        self.assertNotEqual(RelatedPost.objects.filter(blog=second).first().related_id, first.id)
+        job = Job.objects.get()
+        self.assertEqual(job.task, 'blog.related.refresh_neighbours')
+        run_pending()
+        self.assertEqual(RelatedPost.objects.filter(blog=second).first().related_id, first.id)
+
+    def test_rebuild_matches_incremental_refresh(self):
+        refresh_related_posts([blog.id for blog in self.blogs])
+        incremental = list(RelatedPost.objects.values_list('blog_id', 'related_id', 'rank'))
+        rebuild_related_posts()
+        rebuilt = list(RelatedPost.objects.values_list('blog_id', 'related_id', 'rank'))
+        self.assertCountEqual(incremental, rebuilt)
+
+
+class FragmentCacheTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_editing_a_post_refreshes_its_card(self):
+        self.client.get(reverse('home'))
+        blog = self.blogs[-1]
+        blog.title = 'a brand new title'
+        blog.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'A Brand New Title')
+
+    def test_new_comment_refreshes_the_count(self):
+        blog = self.blogs[-1]
+        self.client.get(reverse('home'))
+        Comment.objects.create(comment='late', blog=blog, user=self.user, active=True)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, f'{len(self.commenters) + 1} comments')
+
+    def test_last_post_and_post_share_the_sidebar(self):
+        rebuild_related_posts()
+        latest = self.blogs[-1]
+        response = self.client.get(reverse('last_post'))
+        self.assertEqual(len(response.context['comments']), len(self.commenters))
+        related = list(response.context['related_posts'])
+        self.assertTrue(related)
+        response = self.client.get(reverse('post', args=[latest.id]))
+        for blog in related:
+            self.assertContains(response, reverse('post', args=[blog.id]))
+
+
+@override_settings(**PINNED_QUERIES)
+class ConditionalGetTests(QueryCountMixin, BlogTestData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_unchanged_post_is_not_modified(self):
+        url = reverse('post', args=[self.blogs[0].id])
+        etag = self.client.get(url)['ETag']
+        # the 2 validators, no rendering
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_comment_changes_the_etag(self):
+        url = reverse('post', args=[self.blogs[0].id])
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(comment='new', blog=self.blogs[0], user=self.user, active=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_and_contact_info_change_the_etag(self):
+        url = reverse('home')
+        etag = self.client.get(url)['ETag']
+        profile = self.user.profile
+        profile.name = 'Renamed Reader'
+        profile.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Renamed Reader')
+        etag = response['ETag']
+        self.addCleanup(ContactInfo.invalidate)
+        ContactInfo.objects.create(address='somewhere', tel='1', email='a@b.c', facebook='', twitter='',
+                                   instagram='', youtube='')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_tag_cloud_changes_the_etag(self):
+        url = reverse('post', args=[self.blogs[0].id])
+        etag = self.client.get(url)['ETag']
+        blog = Blog.objects.create(author=self.user, title='new', content='new', image='blog-images/test.png')
+        blog.tags.add('brandnew')
+        refresh_tag_stats(blog.tags.values_list('id', flat=True))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'brandnew')
+
+    def test_home_is_not_modified_until_a_post_changes(self):
+        url = reverse('home')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.blogs[0].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ImageRenditionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_RENDITION_WIDTHS=[100, 300, 1200]
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        buffer = BytesIO()
+        Image.new('RGBA', (640, 480), (200, 10, 10, 128)).save(buffer, format='PNG')
+        self.name = default_storage.save('blog-images/photo.png', ContentFile(buffer.getvalue()))
+
+    def test_renditions_are_not_upscaled(self):
+        manifest = generate_renditions(self.name)
+        self.assertEqual(manifest['widths'], [100, 300, 640])
+        with default_storage.open(rendition_name(self.name, 300, 'jpeg')) as rendition:
+            self.assertEqual(Image.open(rendition).size, (300, 225))
+
+    def test_tag_renders_srcset(self):
+        blog = Blog(image=self.name)
+        template = Template('{% load blog_tags %}{% responsive_image blog.image sizes="50vw" alt="x" %}')
+        self.assertNotIn('srcset', template.render(Context({'blog': blog})))
+        generate_renditions(self.name)
+        html = template.render(Context({'blog': blog}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('renditions/photo.png-300.jpg 300w', html)
+
+    def test_originals_with_the_same_stem_keep_their_renditions(self):
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100)).save(buffer, format='JPEG')
+        other = default_storage.save('blog-images/photo.jpg', ContentFile(buffer.getvalue()))
+        generate_renditions(self.name)
+        generate_renditions(other)
+        cache.clear()
+        self.assertNotEqual(rendition_name(self.name, 100, 'webp'), rendition_name(other, 100, 'webp'))
+        self.assertEqual(get_renditions(self.name)['widths'], [100, 300, 640])
+        self.assertEqual(get_renditions(other)['widths'], [100, 200])
+
+    def test_worker_processes_queued_uploads(self):
+        blog = Blog(image=self.name)
+        template = Template('{% load blog_tags %}{% responsive_image blog.image %}')
+        queue_image_processing(self.name)
+        self.assertIn('placeholder.svg', template.render(Context({'blog': blog})))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertIn('srcset', template.render(Context({'blog': blog})))
+
+    def test_unreadable_upload_falls_back_to_the_original(self):
+        name = default_storage.save('blog-images/corrupt.png', ContentFile(b'not an image'))
+        blog = Blog(image=name)
+        template = Template('{% load blog_tags %}{% responsive_image blog.image %}')
+        queue_image_processing(name)
+        run_pending()
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertFalse(default_storage.exists(manifest_name(name)))
+        self.assertEqual(template.render(Context({'blog': blog})), f'<img src="/media/{name}" alt="">')
+
+    def test_command_processes_pending_images(self):
+        Blog.objects.create(
+            author=User.objects.create_user(username='writer', password='secret-pass-123'),
+            title='photo', content='', image=self.name,
+        )
+        queue_image_processing(self.name)
+        out = StringIO()
+        call_command('generate_image_renditions', stdout=out)
+        self.assertIn('Generated renditions of 1 images', out.getvalue())
+        self.assertEqual(get_renditions(self.name)['widths'], [100, 300, 640])
+        call_command('generate_image_renditions', stdout=out)
+        self.assertIn('(1 already done, 0 failed)', out.getvalue())
+
+    @override_settings(JOB_MAX_ATTEMPTS=1)
+    def test_failed_job_drops_the_pending_manifest(self):
+        queue_image_processing(self.name)
+        with mock.patch('blog.images.generate_renditions', side_effect=RuntimeError):
+            run_pending()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertIsNone(get_renditions(self.name))
+
+
+class JobQueueTests(TestCase):
+
+    @override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_DELAY=0)
+    def test_failing_job_is_retried_then_failed(self):
+        job = enqueue('blog.images.process_image')
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('TypeError', job.last_error)
+
+
+@override_settings(SESSION_ENGINE=PINNED_QUERIES['SESSION_ENGINE'])
+class InstrumentationTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ContactInfo.load()
+        tag_cloud()
+        buffer.samples = []
+        self.login()
+
+    def test_server_timing_reports_the_queries(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('post', args=[self.blogs[0].id]))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn('desc="6 queries, 0 duplicates"', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+
+    @override_settings(ROOT_URLCONF='blog.async_urls')
+    async def test_async_views_report_their_queries(self):
+        # the async views query from the sync_to_async threads
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries')
+
+    @override_settings(REQUEST_METRICS_FLUSH_SIZE=2)
+    def test_samples_are_flushed_in_batches(self):
+        self.client.get(reverse('home'))
+        self.assertFalse(RequestSample.objects.exists())
+        self.client.get(reverse('post', args=[self.blogs[0].id]))
+        self.assertEqual(
+            sorted(RequestSample.objects.values_list('url_name', flat=True)), ['home', 'post']
+        )
+        self.assertEqual([row['url_name'] for row in url_percentiles()], ['home', 'post'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(
+            (percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99)), (50, 95, 99)
+        )
+
+
+class BenchmarkTests(TestCase):
+
+    def test_scenarios_run_on_generated_data(self):
+        data = generate_data(users=3, blogs=10, comments=30, tags=4)
+        self.assertEqual(Blog.objects.count(), 10)
+        self.assertEqual(User.objects.filter(profile__isnull=False).count(), 3)
+        self.assertEqual(
+            sum(Blog.objects.values_list('comment_count', flat=True)),
+            Comment.objects.filter(active=True).count(),
+        )
+        result = run_scenario(scenarios(data)['post'], requests=5, warmup=1)
+        self.assertEqual(result['requests'], 5)
+        self.assertGreater(result['queries'], 0)
+
+    def test_regressions(self):
+        baseline = {'post': {'p95': 10.0, 'queries': 9}}
+        self.assertEqual(regressions({'post': {'p95': 12.0, 'queries': 9}}, baseline), [])
+        self.assertEqual(len(regressions({'post': {'p95': 20.0, 'queries': 10}}, baseline)), 2)
+
+
+@override_settings(**PINNED_QUERIES, BLOG_API_PAGE_SIZE=3)
+class ApiTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.login()
+
+    def test_blogs_are_paginated_by_cursor(self):
+        # posts with authors, their tags
+        with self.assertNumQueries(2):
+            first = self.client.get(reverse('api_blogs')).json()
+        self.assertEqual([blog['id'] for blog in first['results']], [blog.id for blog in self.blogs[:0:-1]])
+        self.assertIn('django', first['results'][0]['tags'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([blog['id'] for blog in second['results']], [self.blogs[0].id])
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fields_skip_the_joins(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_blogs'), {'fields': 'id,title'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+        response = self.client.get(reverse('api_blogs'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comments_of_a_post(self):
+        Comment.objects.create(comment='hidden', blog=self.blogs[0], user=self.user, active=False)
+        response = self.client.get(reverse('api_comments'), {'blog': self.blogs[0].id})
+        comments = response.json()['results']
+        self.assertEqual(len(comments), len(self.commenters))
+        self.assertEqual(comments[0]['user'], self.commenters[-1].username)
+
+    def test_export_streams_ndjson(self):
+        response = self.client.get(reverse('api_export', args=['blogs']), {'fields': 'id,tags'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [blog.id for blog in reversed(self.blogs)])
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'tags'})
+        self.assertEqual(self.client.get(reverse('api_export', args=['users'])).status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_tags')).status_code, 403)
+        # no basic auth, passwords are only checked by the rate limited login page
+        credentials = base64.b64encode(b'reader:secret-pass-123').decode()
+        response = self.client.get(reverse('api_tags'), headers={'Authorization': f'Basic {credentials}'})
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(BLOG_EXCERPT_WORDS=5, BLOG_WORDS_PER_MINUTE=10)
+class ExcerptTests(BlogTestData, TestCase):
+
+    def test_excerpt_follows_the_content(self):
+        blog = self.blogs[0]
+        blog.content = ' '.join(f'word{i}' for i in range(25))
+        blog.save(update_fields=['content'])
+        blog.refresh_from_db()
+        self.assertEqual(blog.excerpt, 'word0 word1 word2 word3 word4…')
+        self.assertEqual((blog.word_count, blog.reading_time), (25, 3))
+        # saving a post loaded without its content leaves the excerpt alone
+        deferred = Blog.objects.defer('content').get(pk=blog.pk)
+        deferred.title = 'renamed'
+        deferred.save()
+        self.assertEqual(Blog.objects.get(pk=blog.pk).excerpt, blog.excerpt)
+
+    def test_feed_does_not_read_the_content(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'content of post 3')
+        self.assertFalse([query for query in captured if '"blog_blog"."content"' in query['sql']])
+
+    def test_backfill_command(self):
+        Blog.objects.update(excerpt='', word_count=0)
+        out = StringIO()
+        call_command('backfill_excerpts', batch_size=3, stdout=out)
+        self.assertIn('Updated the excerpts of 4 blogs', out.getvalue())
+        self.assertEqual(
+            list(Blog.objects.order_by('pk').values_list('excerpt', 'word_count')[:1]),
+            [('content of post 0', 4)],
+        )
+
+
+@override_settings(BLOG_TAGS_PAGE_SIZE=3)
+class TagStatTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def stats(self):
+        return {stat.tag.slug: stat.post_count for stat in TagStat.objects.select_related('tag')}
+
+    def test_views_keep_the_counts(self):
+        self.assertEqual(self.stats(), {'django': 4, 'tag0': 1, 'tag1': 1, 'tag2': 1, 'tag3': 1})
+        blog = self.blogs[0]
+        self.client.post(reverse('edit_blog', args=[blog.id]), {
+            'title': blog.title, 'content': blog.content, 'tags': 'django, fresh',
+        })
+        self.client.post(reverse('delete_blog', args=[self.blogs[1].id]))
+        self.assertEqual(self.stats(), {'django': 3, 'fresh': 1, 'tag2': 1, 'tag3': 1})
+        self.assertIn('fresh', [tag['slug'] for tag in tag_cloud()])
+
+    def test_listing_pages_without_aggregates(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('tag_list'))
+        self.assertEqual([stat.tag.slug for stat in response.context['tags']], ['django', 'tag3', 'tag2'])
+        self.assertFalse([query for query in captured if 'COUNT(' in query['sql']])
+        response = self.client.get(reverse('tag_list'), {'cursor': response.context['tags'].next_cursor})
+        self.assertEqual([stat.tag.slug for stat in response.context['tags']], ['tag1', 'tag0'])
+
+
+class ArchiveTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(self.directory, 'media'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_export_then_import_round_trip(self):
+        path = os.path.join(self.directory, 'blogs.ndjson')
+        call_command('export_blogs', path, stderr=StringIO())
+        dates = {blog.title: blog.date for blog in self.blogs}
+        Blog.objects.all().delete()
+
+        out = StringIO()
+        call_command('import_blogs', path, batch_size=3, stdout=out)
+        self.assertIn('Imported 4 blogs', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        blogs = Blog.objects.prefetch_related('tags').order_by('date')
+        self.assertEqual({blog.title: blog.date for blog in blogs}, dates)
+        self.assertEqual(sorted(tag.slug for tag in blogs[0].tags.all()), ['django', 'tag0'])
+        self.assertEqual(blogs[0].excerpt, 'content of post 0')
+        self.assertEqual(TagStat.objects.get(tag__slug='django').post_count, 4)
+        self.assertEqual(Job.objects.filter(task='blog.images.process_image').count(), 4)
+
+    def test_csv_import_creates_authors_tags_and_copies_images(self):
+        images_dir = os.path.join(self.directory, 'images')
+        os.makedirs(images_dir)
+        Image.new('RGB', (10, 10)).save(os.path.join(images_dir, 'cover.png'))
+        path = os.path.join(self.directory, 'blogs.csv')
+        with open(path, 'w', newline='') as stream:
+            stream.write('title,content,author,tags,date,image\n')
+            stream.write('imported,hello world,newcomer,"Django, brand new",2020-01-02T03:04:05,cover.png\n')
+        call_command('import_blogs', path, images_dir=images_dir, stdout=StringIO())
+
+        blog = Blog.objects.get(title='imported')
+        self.assertEqual(blog.author.profile.name, 'newcomer')
+        self.assertFalse(blog.author.has_usable_password())
+        self.assertEqual(sorted(blog.tags.names()), ['Django', 'brand new'])
+        self.assertEqual(blog.date.year, 2020)
+        self.assertTrue(default_storage.exists(blog.image.name))
+
+    def test_import_refreshes_only_the_imported_posts(self):
+        path = os.path.join(self.directory, 'blogs.ndjson')
+        with open(path, 'w') as stream:
+            stream.write(json.dumps({'title': 'imported zebra', 'author': self.user.username, 'tags': ['django']}) + '\n')
+        rebuild_related_posts()
+        older = self.blogs[0]
+        call_command('import_blogs', path, stdout=StringIO())
+
+        imported = Blog.objects.get(title='imported zebra')
+        self.assertEqual(search_blogs('zebra'), [imported.id])
+        self.assertTrue(RelatedPost.objects.filter(blog=imported).exists())
+        self.assertEqual(TagStat.objects.get(tag__slug='django').post_count, 5)
+        # the older posts sharing the tag are left to the worker
+        self.assertFalse(RelatedPost.objects.filter(blog=older, related=imported).exists())
+        job = Job.objects.get(task='blog.related.refresh_neighbours')
+        self.assertEqual(job.payload['exclude_ids'], [imported.id])
+        run_pending()
+        self.assertTrue(RelatedPost.objects.filter(blog=older, related=imported).exists())
+
+    def test_import_rejects_image_paths_leaving_the_directory(self):
+        images_dir = os.path.join(self.directory, 'images')
+        os.makedirs(images_dir)
+        path = os.path.join(self.directory, 'blogs.ndjson')
+        for image in ('../secret.png', '/etc/passwd', 'covers/../../secret.png'):
+            with open(path, 'w') as stream:
+                stream.write(json.dumps({'title': 'imported', 'author': self.user.username, 'image': image}) + '\n')
+            with self.assertRaisesMessage(CommandError, image):
+                call_command('import_blogs', path, images_dir=images_dir, stdout=StringIO())
+        self.assertFalse(Blog.objects.filter(title='imported').exists())
+
+
+class ModerationTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(BLOG_COMMENT_MODERATION=True)
+    def test_moderated_comments_wait_for_approval(self):
+        self.client.force_login(self.user)
+        blog = self.blogs[0]
+        self.client.post(reverse('add_comment'), {'blog': blog.id, 'content': 'first!'})
+        comment = Comment.objects.get(comment='first!')
+        self.assertFalse(comment.active)
+        blog.refresh_from_db()
+        self.assertEqual(blog.comment_count, len(self.commenters))
+
+    def test_bulk_moderation_is_a_few_statements(self):
+        for i in range(20):
+            Comment.objects.create(comment=f'spam {i}', blog=self.blogs[i % 4], user=self.user)
+        pending = Comment.objects.filter(active=False, moderated_at__isnull=True)
+        # a savepoint around the affected posts, the comments and the
+        # counters of the posts
+        with self.assertNumQueries(5):
+            self.assertEqual(moderate(pending, approve=True), 20)
+        self.assertEqual(
+            list(Blog.objects.order_by('pk').values_list('comment_count', flat=True)),
+            [len(self.commenters) + 5] * 4,
+        )
+
+    def test_admin_reject_action(self):
+        admin_user = User.objects.create_superuser('moderator', 'moderator@example.com', 'secret-pass-123')
+        self.client.force_login(admin_user)
+        comments = Comment.objects.filter(blog=self.blogs[0])
+        response = self.client.post(reverse('admin:blog_comment_changelist'), {
+            'action': 'reject',
+            '_selected_action': list(comments.values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertContains(response, '3 comments rejected.')
+        self.assertFalse(comments.filter(active=True).exists())
+        self.assertFalse(comments.filter(moderated_at__isnull=True).exists())
+        self.blogs[0].refresh_from_db()
+        self.assertEqual(self.blogs[0].comment_count, 0)
+
+
+@override_settings(**PINNED_QUERIES, BLOG_COMMENTS_PAGE_SIZE=2)
+class CommentPaginationTests(BlogTestData, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.login()
+
+    def test_first_render_is_capped(self):
+        response = self.client.get(reverse('post', args=[self.blogs[0].id]))
+        comments = response.context['comments']
+        self.assertEqual([comment.user for comment in comments], self.commenters[:0:-1])
+        self.assertContains(response, 'Load more comments')
+
+    def test_fragment_loads_the_next_page(self):
+        url = reverse('post_comments', args=[self.blogs[0].id])
+        first = self.client.get(reverse('post', args=[self.blogs[0].id])).context['comments']
+        # 2 conditional GET validators, post, page of comments
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'partials/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual([comment.user for comment in response.context['comments']], [self.commenters[0]])
+        self.assertNotContains(response, 'Load more comments')
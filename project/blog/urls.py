@@ -1,17 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# the read-only pages, async under ASGI when BLOG_ASYNC_VIEWS is on
+read_views = async_views if settings.BLOG_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('',views.home,name='home'),
-    path('post/<int:pk>',views.post,name='post'),
-    path('tags/<slug:tag>',views.get_tags,name='tags'),
+    path('',read_views.home,name='home'),
+    path('post/<int:pk>',read_views.post,name='post'),
+    path('post/<int:pk>/comments',views.post_comments,name='post_comments'),
+    path('tags/<slug:tag>',read_views.get_tags,name='tags'),
+    path('tags/',views.tag_list,name='tag_list'),
     path('add_comment',views.add_comment,name='add_comment'),
     path('delete_comment/',views.delete_comment,name='delete_comment'),
-    path('last_post/',views.last_post,name='last_post'),
+    path('last_post/',read_views.last_post,name='last_post'),
     path('contact/',views.contact,name='contact'),
     path('create_blog/',views.create_blog,name='create_blog'),
     path('edit_post/<int:pk>',views.edit_blog,name='edit_blog'),
     path('delete_blog/<int:pk>',views.delete_blog,name='delete_blog'),
+    path('api/blogs',api.blog_list,name='api_blogs'),
+    path('api/blogs/<int:pk>',api.blog_detail,name='api_blog'),
+    path('api/comments',api.comment_list,name='api_comments'),
+    path('api/tags',api.tag_list,name='api_tags'),
+    path('api/export/<slug:resource>.ndjson',api.export,name='api_export'),
   
     
 ]
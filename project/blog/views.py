@@ -1,13 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from .models import Blog, Comment, ContactInfo, Tag
+from django.conf import settings
+from django.db import transaction
+from .models import Blog, Comment, ContactInfo, Tag, TagStat
 from .forms import BlogForm, ContactForm
+from .images import queue_image_processing
+from .conditional import conditional_page, feed_validator, post_validator, tag_validator
+from .pagination import CursorPaginator
+from .related import refresh_after_tag_change
+from .replicas import read_replica, writes_to_primary
+from .search import ranked_blogs
+from .tagstats import refresh_tag_stats
 
 
 @login_required
+@writes_to_primary
 def delete_blog(request, pk):
     """
     Deletes a blog post.
@@ -20,11 +28,15 @@ def delete_blog(request, pk):
         HttpResponseRedirect: Redirects to the home page after deletion.
     """
     post = Blog.objects.get(id=pk)
+    tag_ids = list(post.tags.values_list('id', flat=True))
     post.delete()
+    refresh_after_tag_change(pk, tag_ids)
+    refresh_tag_stats(tag_ids)
     return redirect('home')
 
 
 @login_required
+@writes_to_primary
 def edit_blog(request, pk):
     """
     Edits an existing blog post.
@@ -41,7 +53,7 @@ def edit_blog(request, pk):
         HttpResponseRedirect: Redirects to home after a successful edit.
     """
     post = Blog.objects.get(id=pk)
-    tags = post.tags.all()
+    old_tag_ids = set(post.tags.values_list('id', flat=True))
     if request.user == post.author:
         if request.method == 'POST':
             form = BlogForm(request.POST, request.FILES, instance=post)
@@ -49,9 +61,16 @@ def edit_blog(request, pk):
                 edited_post = form.save(commit=False)
                 edited_post.author = request.user
                 edited_post.save()
+                if 'image' in form.changed_data:
+                    queue_image_processing(edited_post.image.name, blog_id=edited_post.id)
                 # saving the new tags 
                 tag_names = form.cleaned_data.get('tags')  
                 edited_post.tags.set(tag_names)
+                new_tag_ids = set(edited_post.tags.values_list('id', flat=True))
+                if new_tag_ids != old_tag_ids:
+                    refresh_after_tag_change(edited_post.id, old_tag_ids | new_tag_ids)
+                    # only the added and removed tags change their counts
+                    refresh_tag_stats(old_tag_ids ^ new_tag_ids)
 
                 messages.success(request, 'Post has been updated ...')
                 return redirect('home')
@@ -65,6 +84,7 @@ def edit_blog(request, pk):
 
 
 @login_required
+@writes_to_primary
 def create_blog(request):
     """
     Creates a new blog post.
@@ -84,6 +104,11 @@ def create_blog(request):
             new_blog = form.save(commit=False)
             new_blog.author = request.user
             new_blog.save()
+            form.save_m2m()
+            queue_image_processing(new_blog.image.name, blog_id=new_blog.id)
+            tag_ids = list(new_blog.tags.values_list('id', flat=True))
+            refresh_after_tag_change(new_blog.id, tag_ids)
+            refresh_tag_stats(tag_ids)
             messages.success(request, 'The Blog has been created successfully...')
             return redirect('home')
         
@@ -106,7 +131,7 @@ def contact(request):
         HttpResponse: Renders the contact page.
         HttpResponseRedirect: Redirects to home after successful submission.
     """
-    info = ContactInfo.objects.all().first()
+    info = ContactInfo.load()
     if request.method == 'POST':
         form = ContactForm(request.POST)
         if form.is_valid():
@@ -122,6 +147,8 @@ def contact(request):
 
 
 @login_required
+@read_replica
+@conditional_page(feed_validator)
 def last_post(request):
     """
     Retrieves the latest blog post.
@@ -130,13 +157,20 @@ def last_post(request):
         request (HttpRequest): The HTTP request object.
 
     Returns:
-        HttpResponse: Renders the latest blog post.
+        HttpResponse: Renders the latest blog post, like ``post``.
     """
-    post = Blog.objects.latest('date')
-    return render(request, 'pages/post.html', {'post': post})
+    post = Blog.objects.select_related('author').prefetch_related('tags').latest('date')
+    # the same context as post, the page shares its cached sidebar
+    context = {
+        'post': post,
+        'comments': comment_paginator(post.id).get_page(request.GET.get('cursor')),
+        'related_posts': related_posts_of(post.id),
+    }
+    return render(request, 'pages/post.html', context)
 
 
 @login_required
+@writes_to_primary
 def delete_comment(request):
     """
     Deletes a comment on a blog post.
@@ -150,11 +184,14 @@ def delete_comment(request):
     if request.method == 'POST':
         pk = request.POST.get('comment-pk')
         comment = Comment.objects.get(id=pk)
-        comment.delete()
+        # the comment counter of the blog is decremented by the post_delete signal
+        with transaction.atomic():
+            comment.delete()
         return redirect("post", comment.blog.id)
 
 
 @login_required
+@writes_to_primary
 def add_comment(request):
     """
     Adds a new comment to a blog post.
@@ -169,18 +206,24 @@ def add_comment(request):
         blog = Blog.objects.get(id=request.POST.get("blog"))
         content = request.POST.get("content")
         user = request.user
-        active = True
-        new_comment = Comment.objects.create(
-            comment=content,
-            blog=blog,
-            user=user,
-            active=active,
-        )
-        new_comment.save()
+        # moderated comments wait for a moderator (see moderation.py)
+        active = not settings.BLOG_COMMENT_MODERATION
+        # the comment counter of the blog is incremented by the post_save signal
+        with transaction.atomic():
+            Comment.objects.create(
+                comment=content,
+                blog=blog,
+                user=user,
+                active=active,
+            )
+        if not active:
+            messages.info(request, 'Your comment will be shown once a moderator approves it.')
         return redirect('post', request.POST.get("blog"))
 
 
 @login_required
+@read_replica
+@conditional_page(tag_validator)
 def get_tags(request, tag):
     """
     Retrieves all blog posts associated with a specific tag.
@@ -190,19 +233,65 @@ def get_tags(request, tag):
         tag (str): The slug of the tag.
 
     Returns:
-        HttpResponse: Renders the blog index page with filtered posts.
+        HttpResponse: Renders the blog index page with a page of filtered posts.
     """
     tag = get_object_or_404(Tag, slug=tag)
-    blogs = Blog.objects.filter(tags__in=[tag])
-    return render(request, 'pages/index.html', {'blogs': blogs})
+    blogs = Blog.objects.filter(tags__in=[tag]).select_related('author').defer('content')
+    paginator = CursorPaginator(blogs, settings.BLOG_PAGE_SIZE)
+    page_posts = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'pages/index.html', {'blogs': page_posts})
+
+
+@login_required
+@read_replica
+def tag_list(request):
+    """
+    Lists the tags in use, most used first.
+
+    Reads the maintained tag statistics, a page at a time.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: Renders the tag listing page.
+    """
+    stats = TagStat.objects.select_related('tag')
+    paginator = CursorPaginator(stats, settings.BLOG_TAGS_PAGE_SIZE, ordering=('-post_count', '-tag'))
+    page_tags = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'pages/tags.html', {'tags': page_tags})
+
+
+def comment_paginator(pk):
+    """
+    Returns the keyset paginator of the active comments of a post, newest first.
+    """
+    comments = Comment.objects.filter(blog_id=pk, active=True).select_related('user__profile')
+    return CursorPaginator(comments, settings.BLOG_COMMENTS_PAGE_SIZE, ordering=('-id',))
+
+
+def related_posts_of(pk):
+    """
+    Returns the precomputed related posts of a post, best first.
+    """
+    return (
+        Blog.objects.filter(related_to_entries__blog_id=pk)
+        .only('id', 'title', 'image')
+        .order_by('related_to_entries__rank')
+    )
 
 
 @login_required
+@read_replica
+@conditional_page(post_validator)
 def post(request, pk):
     """
     Retrieves a specific blog post and its comments.
 
-    Also fetches related posts based on shared tags.
+    Also fetches the related posts precomputed from shared tags. Only the
+    first ``BLOG_COMMENTS_PAGE_SIZE`` comments are shown. Comment authors,
+    their profiles and the post tags are loaded up front, so rendering the
+    page does not query per comment.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -211,26 +300,50 @@ def post(request, pk):
     Returns:
         HttpResponse: Renders the blog post page.
     """
-    post = Blog.objects.get(id=pk)
-    comments = Comment.objects.filter(blog=post, active=True).order_by('-id')
-    # getting related posts 
-    tags = post.tags.all()
-    related_posts = Blog.objects.filter(tags__in=tags).exclude(id=post.id).distinct()
-
+    post = get_object_or_404(
+        Blog.objects.select_related('author').prefetch_related('tags'), id=pk
+    )
+    # at most a page of comments, the next ones come from post_comments
+    comments = comment_paginator(pk).get_page(request.GET.get('cursor'))
     context = {
         'post': post,
         'comments': comments,
-        'related_posts': related_posts
+        'related_posts': related_posts_of(pk)
     }
     return render(request, 'pages/post.html', context)
 
 
 @login_required
+@read_replica
+@conditional_page(post_validator)
+def post_comments(request, pk):
+    """
+    Renders the next page of comments of a post, as an HTML fragment.
+
+    Called by the "load more" link of the post page.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with the ``cursor``
+            of the page in the query string.
+        pk (int): The primary key of the blog post.
+
+    Returns:
+        HttpResponse: The comments and the link to the following page.
+    """
+    post = get_object_or_404(Blog.objects.only('id', 'author_id'), id=pk)
+    comments = comment_paginator(pk).get_page(request.GET.get('cursor'))
+    return render(request, 'partials/comments.html', {'post': post, 'comments': comments})
+
+
+@login_required
+@read_replica
+@conditional_page(feed_validator)
 def home(request):
     """
     Displays the home page with a list of blog posts.
 
-    Allows searching and paginates results.
+    Allows searching (results are ranked by relevance) and paginates results
+    with cursors, so deep pages cost the same as the first one.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -240,17 +353,17 @@ def home(request):
     """
     search = request.GET.get('search')
     if search:
-        blogs = Blog.objects.filter(
-            Q(content__icontains=search) | Q(title__icontains=search)
-        ).annotate(num_comments=Count('comment')).order_by('-date')
+        blogs = ranked_blogs(search, Blog.objects.select_related('author').defer('content'))
+        paginator = CursorPaginator(blogs, settings.BLOG_PAGE_SIZE, ordering=('search_rank',))
     else:
-        blogs = Blog.objects.annotate(num_comments=Count('comment')).order_by('-date')
+        # the cards show the stored excerpt, the content is only read by post
+        blogs = Blog.objects.select_related('author').defer('content')
+        paginator = CursorPaginator(blogs, settings.BLOG_PAGE_SIZE)
 
-    paginator = Paginator(blogs, 2)
-    page_num = request.GET.get('page')
-    page_posts = paginator.get_page(page_num)
+    page_posts = paginator.get_page(request.GET.get('cursor'))
 
     context = {
-        'blogs': page_posts, 
+        'blogs': page_posts,
+        'search': search,
     }
     return render(request, 'pages/index.html', context)
@@ -0,0 +1,17 @@
+"""
+Per-connection database setup.
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver applying the SQLite pragmas of the settings.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # unset, the file keeps the journal mode it has
+        if settings.SQLITE_JOURNAL_MODE:
+            cursor.execute(f'PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}')
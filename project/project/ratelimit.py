@@ -0,0 +1,104 @@
+"""
+Rate limiting of the endpoints that are expensive to abuse.
+
+``RateLimitMiddleware`` counts the POSTs of every URL name listed in the
+``RATELIMITS`` setting, per user when logged in and per IP address otherwise,
+and answers ``429 Too Many Requests`` once the limit is reached. It runs in
+``process_view``, before the view, so a rejected request never reaches the
+ORM or the password hasher.
+
+The counters live in the cache and are only changed with ``add`` and
+``incr``, which are atomic on every shared cache backend. A limit like
+``5/m`` is enforced over a sliding window: the count of the current minute
+plus the share of the previous minute that is still inside the last 60
+seconds, so there is no double burst around the start of a minute.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+KEY = 'ratelimit:{}:{}:{}'
+
+
+def parse_rate(rate):
+    """
+    Reads a rate like ``'5/m'`` into ``(5, 60)``, requests and seconds.
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def client_key(request):
+    """
+    Returns who is making the request: the user, or the IP address.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    address = request.META.get(settings.RATELIMIT_IP_HEADER) or request.META.get('REMOTE_ADDR', '')
+    # proxies append to X-Forwarded-For, the last address is the one our proxy saw
+    return f"ip:{address.split(',')[-1].strip()}"
+
+
+def _incr(cache, key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        cache.add(key, 1, timeout)
+        return 1
+
+
+def hit(name, client, rate):
+    """
+    Counts one request and checks it against the rate.
+
+    Args:
+        name (str): The URL name of the endpoint.
+        client (str): The key of the client, see ``client_key``.
+        rate (str): The limit, e.g. ``'5/m'``.
+
+    Returns:
+        int: 0 when the request is allowed, else the seconds to wait.
+    """
+    limit, period = parse_rate(rate)
+    cache = caches[settings.RATELIMIT_CACHE]
+    now = time.time()
+    window, offset = divmod(now, period)
+    window = int(window)
+    # kept two periods, the next window still reads this one
+    current = _incr(cache, KEY.format(name, client, window), period * 2)
+    previous = cache.get(KEY.format(name, client, window - 1), 0)
+    count = previous * (1 - offset / period) + current
+    if count <= limit:
+        return 0
+    return max(1, math.ceil(period - offset))
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Applies ``RATELIMITS`` to the POSTs of the views, see the module docstring.
+
+    Put it after ``AuthenticationMiddleware`` so logged in users are counted
+    per account.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATELIMIT_ENABLED or request.method != 'POST':
+            return None
+        name = request.resolver_match.view_name
+        rate = settings.RATELIMITS.get(name)
+        if not rate:
+            return None
+        retry_after = hit(name, client_key(request), rate)
+        if not retry_after:
+            return None
+        response = HttpResponse('Too many requests, please try again later.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response